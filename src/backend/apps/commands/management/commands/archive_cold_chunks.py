@@ -0,0 +1,30 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from metrics.cold_storage import archive_chunks
+from metrics.sharding import fan_out
+
+
+class Command(BaseCommand):
+    help = "Export hypertable chunks older than a threshold to Parquet cold storage and drop them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.COLD_STORAGE_AFTER.days,
+            help="Archive chunks that ended more than this many days ago",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="List the chunks without archiving them")
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options["older_than_days"])
+        archived = fan_out(archive_chunks, older_than, dry_run=options["dry_run"])
+
+        for alias, chunks in archived.items():
+            for chunk in chunks:
+                self.stdout.write(f"{alias} {chunk.chunk_name}: [{chunk.range_start}, {chunk.range_end})")
+        archived = [chunk for chunks in archived.values() for chunk in chunks]
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(archived)} chunks to {settings.COLD_STORAGE_URL}"))
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import FloatField, IntegerField
+from django.test import override_settings
+from metrics.models import SeriesStats, TimeSeriesData
+from metrics.planner import QueryPlanner
+from metrics.sharding import shard_for_user, use_shard
+from metrics.views import TimeSeriesDataViewSet
+from metrics import slices
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = "Compare single-statement and time-sliced aggregation latency over growing windows of committed data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", required=True)
+        parser.add_argument("--series", help="Numeric series to aggregate (defaults to the user's largest)")
+        parser.add_argument("--interval", default="week")
+        parser.add_argument("--agg-func", default="avg", choices=slices.SLICEABLE_AGG_FUNCTIONS)
+        parser.add_argument("--weeks", default="4,13,26,52,104,208", help="Window lengths to measure, in weeks")
+        parser.add_argument("--slices", type=int, default=4, help="Slices per query in the sliced runs")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the median is reported")
+
+    def handle(self, *args, **options):
+        with use_shard(shard_for_user(options["user_id"])):
+            stats = self._get_series_stats(options)
+            self.stdout.write(f"{stats.series.series}: {stats.point_count} points, ending {stats.last_time}")
+            self.stdout.write(
+                f"{'weeks':>6} {'chunks':>7} {'slices':>7} {'single ms':>10} {'sliced ms':>10} {'speedup':>8}"
+            )
+
+            for weeks in [int(w) for w in options["weeks"].split(",")]:
+                start, end = stats.last_time - timedelta(weeks=weeks), stats.last_time
+                queryset = TimeSeriesData.timescale.filter(
+                    session__user_id=options["user_id"], series=stats.series, time__range=[start, end]
+                )
+                plan = QueryPlanner().plan(options["interval"], start, end, 1)
+                # Every window is sliced here, even those the API would run as one statement
+                with override_settings(TIMESERIES_PARALLEL_SLICES=options["slices"], TIMESERIES_PARALLEL_MIN_CHUNKS=2):
+                    boundaries = slices.slice_boundaries(plan.chunk_starts)
+
+                single = self._time(queryset, stats.series, plan.interval, options, [])
+                sliced = self._time(queryset, stats.series, plan.interval, options, boundaries)
+                self.stdout.write(
+                    f"{weeks:>6} {plan.chunks:>7} {len(boundaries) + 1:>7} {single:>10.1f} {sliced:>10.1f} "
+                    f"{single / sliced if sliced else 0:>7.2f}x"
+                )
+
+    def _get_series_stats(self, options):
+        stats = SeriesStats.objects.filter(user_id=options["user_id"], point_count__gt=0).select_related("series")
+        if options["series"]:
+            stats = stats.filter(series__series=options["series"])
+        # Only series the API slices: those it aggregates as numbers
+        stats = [s for s in stats.order_by("-point_count") if self._get_fields(s.series)]
+        if not stats:
+            raise CommandError("No numeric series with data for this user")
+        return stats[0]
+
+    def _time(self, queryset, metric_type, interval, options, boundaries):
+        # Aggregate and cast as the API does: RGB channels as integers, a numeric value as a float
+        fields = self._get_fields(metric_type)
+        output_field = IntegerField() if fields == ["r", "g", "b"] else FloatField()
+        timings = []
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            slices.aggregate(queryset, metric_type, fields, interval, options["agg_func"], boundaries, output_field)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def _get_fields(self, metric_type):
+        return TimeSeriesDataViewSet()._get_series_fields(metric_type, "avg")[0]
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Run in a fresh interpreter: load the WSGI application and resolve the URLconf, as a worker does before its
+# first request, then report time, peak RSS and module count
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({
+    "ms": (time.perf_counter() - start) * 1000,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure web worker startup time and memory, optionally comparing environment profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per profile; the median is reported")
+        parser.add_argument(
+            "--profile",
+            action="append",
+            default=[],
+            metavar="NAME:KEY=VALUE,...",
+            help="Environment overrides to measure, e.g. debug:DEBUG=True (repeatable; the current environment "
+            "is always measured as 'current')",
+        )
+
+    def handle(self, *args, **options):
+        profiles = {"current": {}}
+        for profile in options["profile"]:
+            name, _, assignments = profile.partition(":")
+            try:
+                profiles[name] = dict(a.split("=", 1) for a in assignments.split(",") if a)
+            except ValueError:
+                raise CommandError(f"Invalid profile {profile}; expected NAME:KEY=VALUE,...")
+
+        self.stdout.write(f"{'profile':<12} {'startup ms':>11} {'peak RSS MB':>12} {'modules':>8}")
+        for name, overrides in profiles.items():
+            runs = [self._run(overrides) for _ in range(options["repeat"])]
+            self.stdout.write(
+                f"{name:<12} {statistics.median(r['ms'] for r in runs):>11.0f} "
+                f"{statistics.median(r['rss_kb'] for r in runs) / 1024:>12.1f} "
+                f"{statistics.median(r['modules'] for r in runs):>8.0f}"
+            )
+
+    def _run(self, overrides):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, **overrides},
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Startup failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from metrics.profiling import TOKEN_HEADER, issue_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed header value that makes requests carrying it get profiled."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{TOKEN_HEADER}: {issue_token()}")
+        self.stdout.write(self.style.SUCCESS(f"Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds"))
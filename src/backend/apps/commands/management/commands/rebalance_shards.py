@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from metrics.models import UserShard
+from metrics.rebalance import CannotMove, move_user
+from metrics.sharding import ring, sync_metric_types
+
+
+class Command(BaseCommand):
+    help = "Move users to the shard the hash ring assigns them, or one user to a given shard, while serving traffic."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", help="Only move this user")
+        parser.add_argument("--to", help="Target shard for --user-id (defaults to the user's ring shard)")
+        parser.add_argument("--apply", action="store_true", help="Move users; without it only the plan is printed")
+        parser.add_argument("--limit", type=int, help="Move at most this many users")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["to"] and options["to"] not in settings.TIMESERIES_SHARDS:
+            raise CommandError(f"Unknown shard {options['to']}. Shards: {', '.join(settings.TIMESERIES_SHARDS)}")
+
+        pins = UserShard.objects.all()
+        if options["user_id"]:
+            pins = pins.filter(user_id=options["user_id"])
+
+        plan = []
+        for user_id, alias in pins.values_list("user_id", "alias").iterator():
+            target = options["to"] or ring().get(user_id)
+            if target != alias:
+                plan.append((user_id, alias, target))
+        plan = plan[: options["limit"]] if options["limit"] else plan
+
+        for user_id, source, target in plan:
+            self.stdout.write(f"{user_id}: {source} -> {target}")
+        if not options["apply"]:
+            self.stdout.write(self.style.SUCCESS(f"{len(plan)} users to move. Run with --apply to move them."))
+            return
+
+        # New shards need the metric types before any user's rows can reference them
+        sync_metric_types()
+        moved = 0
+        for user_id, source, target in plan:
+            try:
+                move_user(user_id, target, batch_size=options["batch_size"])
+                moved += 1
+            except CannotMove as e:
+                self.stderr.write(f"Skipped: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} of {len(plan)} users"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from metrics.models import MetricType, TimeSeriesData
+from metrics.rollups import refresh_rollups
+from metrics.sharding import fan_out
+
+
+class Command(BaseCommand):
+    help = "Rebuild the rollup pyramid from raw rows, for everything or one user/series."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", help="Only rebuild this user's rollups")
+        parser.add_argument("--series", help="Only rebuild this series")
+
+    def handle(self, *args, **options):
+        rebuilt = sum(fan_out(self._rebuild_shard, options).values())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {rebuilt} (user, series) pairs"))
+
+    def _rebuild_shard(self, options):
+        queryset = TimeSeriesData.objects.all()
+        if options["user_id"]:
+            queryset = queryset.filter(session__user_id=options["user_id"])
+        if options["series"]:
+            queryset = queryset.filter(series__series=options["series"])
+
+        extents = queryset.values("session__user_id", "series_id").annotate(start=Min("time"), end=Max("time"))
+        metric_types = {mt.id: mt for mt in MetricType.objects.all()}
+
+        rebuilt = 0
+        for extent in extents:
+            metric_type = metric_types[extent["series_id"]]
+            if not metric_type.numeric_fields:
+                continue
+            refresh_rollups(extent["session__user_id"], metric_type, extent["start"], extent["end"])
+            rebuilt += 1
+            self.stdout.write(f"Rebuilt {metric_type.series} for user {extent['session__user_id']}")
+        return rebuilt
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from metrics.tasks import rebuild_series_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-(user, series) catalog behind /api/series/ from raw rows, for everyone or one user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", help="Only rebuild this user's series stats")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_series_stats(options["user_id"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt series stats for {rebuilt} (user, series) pairs"))
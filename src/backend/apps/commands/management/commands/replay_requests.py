@@ -0,0 +1,178 @@
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+ID_SEGMENT = re.compile(r"^([0-9a-fA-F-]{32,36}|\d+)$")
+
+
+class Command(BaseCommand):
+    help = "Replay recorded request logs (JSONL) against a running server and report latency per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="Path to a JSONL file with one recorded request per line")
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--concurrency", type=int, default=100, help="Maximum number of in-flight requests")
+        parser.add_argument(
+            "--rate", type=float, default=0, help="Fixed requests/second, ignoring recorded timestamps (0 = off)"
+        )
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=0,
+            help="Time-compression factor applied to recorded timestamps, e.g. 10 replays 10x faster (0 = off)",
+        )
+        parser.add_argument("--loops", type=int, default=1, help="Number of times to replay the log")
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+
+    def handle(self, *args, **options):
+        records, skipped = self._load_records(options["log"])
+        if not records:
+            raise CommandError(f"No replayable records found in {options['log']}")
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} records without a method/path"))
+
+        self.stdout.write(
+            f"Replaying {len(records)} requests x{options['loops']} against {options['base_url']} "
+            f"(concurrency={options['concurrency']}, rate={options['rate'] or '-'}, speed={options['speed'] or '-'})"
+        )
+        latencies, errors, elapsed = asyncio.run(self._replay(records, options))
+        self._report(latencies, errors, elapsed)
+
+    def _load_records(self, path):
+        """Read the JSONL log, keeping only entries that describe an HTTP request."""
+        records = []
+        skipped = 0
+        with open(path) as f:
+            for number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise CommandError(f"Invalid JSON on line {number} of {path}: {e}")
+                if not isinstance(record, dict):
+                    raise CommandError(f"Line {number} of {path} is not a JSON object")
+                if "method" not in record or "path" not in record:
+                    skipped += 1
+                    continue
+                record["offset"] = self._parse_ts(record.get("ts"))
+                records.append(record)
+
+        # Recorded timestamps become offsets from the first request
+        offsets = [r["offset"] for r in records if r["offset"] is not None]
+        first = min(offsets) if offsets else 0
+        for record in records:
+            record["offset"] = record["offset"] - first if record["offset"] is not None else None
+        return records, skipped
+
+    def _parse_ts(self, ts):
+        """Accept epoch seconds or an ISO 8601 string"""
+        if ts is None:
+            return None
+        if isinstance(ts, (int, float)):
+            return float(ts)
+        dt = parse_datetime(ts)
+        if dt is None:
+            raise CommandError(f"Invalid timestamp in request log: {ts}")
+        return dt.timestamp()
+
+    def _schedule(self, index, record, options):
+        """Seconds after replay start at which the request should be sent, or None to send immediately."""
+        if options["rate"]:
+            return index / options["rate"]
+        if options["speed"] and record["offset"] is not None:
+            return record["offset"] / options["speed"]
+        return None
+
+    async def _replay(self, records, options):
+        import aiohttp
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        pending = set()
+
+        connector = aiohttp.TCPConnector(limit=options["concurrency"], ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=options["timeout"])
+        async with aiohttp.ClientSession(options["base_url"], connector=connector, timeout=timeout) as session:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for _ in range(options["loops"]):
+                loop_start = loop.time()
+                for index, record in enumerate(records):
+                    offset = self._schedule(index, record, options)
+                    if offset is not None:
+                        delay = loop_start + offset - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+
+                    await semaphore.acquire()
+                    task = asyncio.create_task(self._send(session, record, semaphore, latencies, errors))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending)
+            elapsed = loop.time() - started
+
+        return latencies, errors, elapsed
+
+    async def _send(self, session, record, semaphore, latencies, errors):
+        import aiohttp
+
+        endpoint = self._endpoint(record)
+        start = time.perf_counter()
+        try:
+            async with session.request(
+                record["method"].upper(),
+                record["path"],
+                params=record.get("params"),
+                json=record.get("body"),
+                headers=record.get("headers"),
+            ) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors[endpoint] += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors[endpoint] += 1
+        finally:
+            latencies[endpoint].append(time.perf_counter() - start)
+            semaphore.release()
+
+    def _endpoint(self, record):
+        """Group requests by method and path, collapsing IDs so detail routes share one row"""
+        path = record["path"].split("?", 1)[0]
+        segments = ["{id}" if ID_SEGMENT.match(s) else s for s in path.split("/")]
+        return f"{record['method'].upper()} {'/'.join(segments)}"
+
+    def _percentile(self, sorted_values, pct):
+        """Nearest-rank percentile of an already sorted list"""
+        index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+        return sorted_values[index]
+
+    def _report(self, latencies, errors, elapsed):
+        total = sum(len(v) for v in latencies.values())
+        total_errors = sum(errors.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent {total} requests in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} req/s), "
+                f"{total_errors} errors ({total_errors / total * 100 if total else 0:.2f}%)"
+            )
+        )
+
+        header = f"{'endpoint':<40} {'count':>8} {'err%':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for endpoint in sorted(latencies):
+            values = sorted(latencies[endpoint])
+            error_rate = errors[endpoint] / len(values) * 100
+            p50, p90, p99 = (self._percentile(values, p) * 1000 for p in (50, 90, 99))
+            self.stdout.write(
+                f"{endpoint:<40} {len(values):>8} {error_rate:>6.2f}% "
+                f"{p50:>7.1f}ms {p90:>7.1f}ms {p99:>7.1f}ms {values[-1] * 1000:>7.1f}ms"
+            )
@@ -2,18 +2,20 @@ import random
 import uuid
 import time
 from datetime import timedelta
-from faker import Faker
 from django.utils import timezone
+from django.utils.functional import cached_property
 from datetime import datetime
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from metrics.models import MetricType, Session, TimeSeriesData
+from metrics.models import MetricType, SeriesStats, Session, TimeSeriesData
+from metrics.rollups import refresh_rollups
+from metrics.sharding import shard_for_user, use_shard
 from django.db.models import Avg, FloatField
 from django.db.models.functions import Cast
 from django.test import Client
 from urllib.parse import urlencode
 
-fake = Faker()
+USER_ID = "d38834e0-fe46-4bf9-831d-1d5b125bdc9b"
 
 
 class Command(BaseCommand):
@@ -28,10 +30,14 @@ class Command(BaseCommand):
         parser.add_argument("--points", type=int, default=10)
 
     def handle(self, *args, **options):
+        with use_shard(shard_for_user(USER_ID)):
+            self._run(options)
+
+    def _run(self, options):
         self._store_original_state()
 
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=shard_for_user(USER_ID)):
                 self._generate_data(options["sessions"], options["points"])
                 self._test_query_performance()
                 self._test_api_performance()
@@ -75,13 +81,13 @@ class Command(BaseCommand):
                     session_time = max(session_time, session_time_limit)
                     session_time = session_time + timedelta(hours=random.randint(1, 12))
 
-                    session = Session.objects.create(
-                        user_id="d38834e0-fe46-4bf9-831d-1d5b125bdc9b", start_ts=session_time
-                    )
+                    session = Session.objects.create(user_id=USER_ID, start_ts=session_time)
 
-                    for _ in range(points_per_session):
+                    # Distinct minutes per session, so no (session, series, time) repeats under the unique constraint
+                    offsets = random.sample(range(1, max(60, points_per_session) + 1), points_per_session)
+                    for minutes in offsets:
                         metric_type = random.choice(metric_types)
-                        timestamp = session_time + timedelta(minutes=random.randint(1, 60))
+                        timestamp = session_time + timedelta(minutes=minutes)
                         value = self._generate_random_value(metric_type.series)
                         data_points.append(
                             TimeSeriesData(session=session, series=metric_type, value=value, time=timestamp)
@@ -113,6 +119,17 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(f"Created {points_created} total data points"))
 
+        # bulk_create bypasses the ingest path, so build the rollups ingest would have queued
+        start = time.time()
+        for metric_type in metric_types:
+            refresh_rollups(USER_ID, metric_type, base_time, session_time + timedelta(hours=1))
+        self.stdout.write(self.style.SUCCESS(f"Built rollups in {time.time() - start:.3f}s"))
+
+        # The series catalog behind /api/timeseries/ and /api/series/ is maintained by ingest too
+        start = time.time()
+        SeriesStats.rebuild(USER_ID)
+        self.stdout.write(self.style.SUCCESS(f"Built series stats in {time.time() - start:.3f}s"))
+
     def _test_query_performance(self):
         """Run a few queries that mimic what TimeSeriesDataViewSet does."""
         self.stdout.write("Testing query performance...")
@@ -178,7 +195,7 @@ class Command(BaseCommand):
 
         # Test Case 1: Month-level single series avg aggregation
         params = {
-            "user_id": "d38834e0-fe46-4bf9-831d-1d5b125bdc9b",
+            "user_id": USER_ID,
             "interval": "month",
             "series": "session.gut_health_score",
             "agg_func": "avg",
@@ -214,6 +231,13 @@ class Command(BaseCommand):
             )
         )
 
+    @cached_property
+    def _fake(self):
+        # Faker is slow to import and only text series need it
+        from faker import Faker
+
+        return Faker()
+
     def _generate_random_value(self, series_name):
         """Generate a random value based on series type."""
         if "color" in series_name:
@@ -223,7 +247,7 @@ class Command(BaseCommand):
         elif "count" in series_name:
             return {"value": random.randint(0, 2)}
         else:
-            return {"value": fake.text()}
+            return {"value": self._fake.text()}
 
     def _cleanup(self):
         """Remove any newly created data."""
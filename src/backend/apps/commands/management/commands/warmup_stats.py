@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from metrics import warmup
+
+
+class Command(BaseCommand):
+    help = "Report how /api/timeseries/ lookups were served by the response cache and by warmed entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after reporting")
+
+    def handle(self, *args, **options):
+        stats = warmup.get_stats()
+        self.stdout.write(
+            f"lookups: {stats.get('hits', 0) + stats.get('misses', 0)}, hits: {stats.get('hits', 0)}, "
+            f"warm hits: {stats.get('warm_hits', 0)}, responses warmed: {stats.get('warmed', 0)}"
+        )
+        for name in ("hit_ratio", "warm_hit_ratio"):
+            ratio = stats[name]
+            self.stdout.write(f"{name}: {'-' if ratio is None else f'{ratio:.1%}'}")
+        if options["reset"]:
+            warmup.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -1,6 +1,157 @@
+from datetime import timedelta
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+import uuid
+
 from .models import MetricType, Session, TimeSeriesData
+from .utils import estimated_count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Takes its count from the planner's estimate instead of an exact COUNT(*)"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class TimeWindowFilter(admin.SimpleListFilter):
+    """Recent-window filter that is always applied, so changelists only scan the newest chunks"""
+
+    title = "time"
+    parameter_name = "window"
+    time_field = "time"
+    default = "24h"
+    WINDOWS = {
+        "1h": ("Last hour", timedelta(hours=1)),
+        "24h": ("Last 24 hours", timedelta(days=1)),
+        "7d": ("Last 7 days", timedelta(days=7)),
+        "30d": ("Last 30 days", timedelta(days=30)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.WINDOWS.items()]
+
+    def value(self):
+        value = super().value()
+        return value if value in self.WINDOWS else self.default
+
+    def choices(self, changelist):
+        # No "All" choice: an unbounded window would scan the whole hypertable
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == lookup,
+                "query_string": changelist.get_query_string({self.parameter_name: lookup}),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        window = self.WINDOWS[self.value()][1]
+        return queryset.filter(**{f"{self.time_field}__gte": timezone.now() - window})
+
+
+class SessionStartFilter(TimeWindowFilter):
+    title = "start time"
+    time_field = "start_ts"
+
+
+class KeysetChangeList(ChangeList):
+    """Changelist paged by a cursor on `keyset_fields` (newest first) instead of page numbers and OFFSET.
+
+    The cursor travels in the page parameter, which the changelist already keeps out of its filters.
+    """
+
+    def get_ordering(self, request, queryset):
+        return [f"-{field}" for field in self.model_admin.keyset_fields]
+
+    def get_results(self, request):
+        time_field, key_field = self.model_admin.keyset_fields
+        queryset = self.queryset
+        cursor = request.GET.get(PAGE_VAR)
+        if cursor:
+            time, key = self._parse_cursor(cursor, time_field, key_field)
+            older = Q(**{f"{time_field}__lt": time}) | Q(**{time_field: time, f"{key_field}__lt": key})
+            queryset = queryset.filter(older)
+
+        rows = list(queryset[: self.list_per_page + 1])
+        self.result_list = rows[: self.list_per_page]
+        self.next_page_url = None
+        if len(rows) > self.list_per_page:
+            last = self.result_list[-1]
+            next_cursor = f"{getattr(last, time_field).isoformat()}|{getattr(last, key_field)}"
+            self.next_page_url = self.get_query_string({PAGE_VAR: next_cursor})
+        self.first_page_url = self.get_query_string(remove=[PAGE_VAR]) if cursor else None
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = bool(self.next_page_url or cursor)
+
+    def _parse_cursor(self, cursor, time_field, key_field):
+        time, _, key = cursor.partition("|")
+        time = parse_datetime(time)
+        try:
+            key = self.opts.get_field(key_field).to_python(key)
+        except ValidationError:
+            key = None
+        if time is None or key is None:
+            raise IncorrectLookupParameters(f"Invalid cursor {cursor}")
+        return time, key
+
+
+class HypertableAdmin(admin.ModelAdmin):
+    """Changelists that stay cheap on large tables: estimated counts, keyset pages, no facets or sorting"""
+
+    change_list_template = "admin/metrics/keyset_change_list.html"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    sortable_by = ()
+    list_per_page = 100
+    keyset_fields = ("time", "id")
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+@admin.register(MetricType)
+class MetricTypeAdmin(admin.ModelAdmin):
+    list_display = ["series", "description", "created_at"]
+    search_fields = ["series"]
+
+
+@admin.register(Session)
+class SessionAdmin(HypertableAdmin):
+    list_display = ["session_id", "user_id", "start_ts"]
+    list_filter = [SessionStartFilter]
+    keyset_fields = ("start_ts", "session_id")
+    search_fields = ["user_id"]
+    search_help_text = "Exact user ID"
+
+    def get_search_results(self, request, queryset, search_term):
+        # Matching the UUID exactly keeps the search on the user_id index
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(user_id=uuid.UUID(search_term.strip())), False
+        except ValueError:
+            return queryset.none(), False
+
 
-admin.site.register(MetricType)
-admin.site.register(Session)
-admin.site.register(TimeSeriesData)
+@admin.register(TimeSeriesData)
+class TimeSeriesDataAdmin(HypertableAdmin):
+    list_display = ["time", "series", "session", "value"]
+    list_filter = [TimeWindowFilter, "series"]
+    list_select_related = ["series", "session"]
+    raw_id_fields = ["session"]
+    autocomplete_fields = ["series"]
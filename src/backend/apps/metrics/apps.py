@@ -8,3 +8,7 @@ logger = logging.getLogger(__name__)
 
 class MetricsConfig(AppConfig):
     name = "metrics"
+
+    def ready(self):
+        # Connect signal receivers that keep derived aggregates in sync with ingest
+        from . import catalog, generations, hot_tier, registry, rollups  # noqa: F401
@@ -0,0 +1,24 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import SeriesStats, Session, SessionSummary
+from .sharding import use_shard
+
+
+def series_with_data(user_id, metric_types, start=None, end=None):
+    """Catalog entries of the `metric_types` a user has points for in [start, end], with their metric type"""
+    stats = SeriesStats.objects.filter(user_id=user_id, series__in=metric_types, point_count__gt=0)
+    if start:
+        stats = stats.filter(last_time__gte=start)
+    if end:
+        stats = stats.filter(first_time__lte=end)
+    return stats.select_related("series").order_by("series__series")
+
+
+@receiver(pre_delete, sender=Session)
+def remove_deleted_session(sender, instance, using=None, **kwargs):
+    # The summary is deleted along with the session, so read what it held first
+    with use_shard(using):
+        summary = SessionSummary.objects.filter(session=instance).first()
+        if summary is not None:
+            SeriesStats.remove_session(instance.user_id, summary)
@@ -0,0 +1,238 @@
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+import logging
+import os
+import tempfile
+
+from .models import ColdChunk, DirtyRange, Session, TimeSeriesData
+from .planner import QueryPlanner
+from .sharding import current_shard, shard_connection
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_UNTIL_CACHE_KEY = "timeseries:cold:archived_until:{shard}"
+
+# Parquet columns; numeric and RGB fields are extracted at export so cold scans don't parse JSON
+COLUMNS = {
+    "session_id": "VARCHAR",
+    "series_id": "BIGINT",
+    "time": "TIMESTAMP",
+    "value": "VARCHAR",
+    "value_num": "DOUBLE",
+    "r": "DOUBLE",
+    "g": "DOUBLE",
+    "b": "DOUBLE",
+    "value_text": "VARCHAR",
+    "user_id": "VARCHAR",
+}
+NUMERIC_KEYS = {"value_num": "value", "r": "r", "g": "g", "b": "b"}
+
+DUCKDB_AGGREGATES = {
+    "avg": "avg({})",
+    "min": "min({})",
+    "max": "max({})",
+    "count": "count({})",
+    "first": "arg_min({}, time)",
+    "last": "arg_max({}, time)",
+    "mode": "mode({})",
+    "count_distinct": "count(DISTINCT {})",
+}
+
+
+def archived_until():
+    """End of the current shard's archived range, before which everything lives in Parquet; None when empty"""
+    cache_key = ARCHIVED_UNTIL_CACHE_KEY.format(shard=current_shard())
+    value = cache.get(cache_key)
+    if value is None:
+        value = ColdChunk.objects.aggregate(end=Max("range_end"))["end"] or False
+        cache.set(cache_key, value, timeout=None)
+    return value or None
+
+
+def archive_chunks(older_than, dry_run=False):
+    """Export hypertable chunks that end before `older_than` to Parquet and drop them, oldest first.
+
+    Archiving stops at the first chunk with pending dirty ranges, since its rollups still have to be
+    refreshed from the raw rows; the archived range always stays contiguous from the oldest chunk.
+    """
+    archived = []
+    for chunk_schema, chunk_name, range_start, range_end in _archivable_chunks(older_than):
+        if DirtyRange.objects.filter(start__lt=range_end, end__gte=range_start).exists():
+            logger.info(f"Stopping at {chunk_name}: its dirty ranges are not refreshed yet")
+            break
+        if dry_run:
+            archived.append(ColdChunk(chunk_name=chunk_name, range_start=range_start, range_end=range_end))
+            continue
+        archived.append(_archive_chunk(chunk_schema, chunk_name, range_start, range_end))
+
+    if archived and not dry_run:
+        cache.delete(ARCHIVED_UNTIL_CACHE_KEY.format(shard=current_shard()))
+        QueryPlanner.invalidate_chunk_stats()
+    return archived
+
+
+def _archivable_chunks(older_than):
+    with shard_connection().cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT chunk_schema, chunk_name, range_start, range_end
+            FROM timescaledb_information.chunks
+            WHERE hypertable_name = %s AND range_end <= %s
+            ORDER BY range_start
+            """,
+            [TimeSeriesData._meta.db_table, older_than],
+        )
+        return cursor.fetchall()
+
+
+def _archive_chunk(chunk_schema, chunk_name, range_start, range_end):
+    connection = shard_connection()
+    qn = connection.ops.quote_name
+    chunk = f"{qn(chunk_schema)}.{qn(chunk_name)}"
+    path = _join(settings.COLD_STORAGE_URL, current_shard(), TimeSeriesData._meta.db_table, chunk_name)
+    numeric = ", ".join(
+        f"CASE WHEN jsonb_typeof(t.value -> '{key}') = 'number' THEN (t.value ->> '{key}')::float END AS {column}"
+        for column, key in NUMERIC_KEYS.items()
+    )
+    select = (
+        f"SELECT t.session_id, t.series_id, t.time AT TIME ZONE 'UTC', t.value::text, {numeric}, "
+        f"t.value ->> 'value' AS value_text, s.user_id "
+        f"FROM {chunk} t JOIN {qn(Session._meta.db_table)} s ON s.session_id = t.session_id"
+    )
+
+    with transaction.atomic(using=connection.alias), tempfile.NamedTemporaryFile(suffix=".csv") as csv_file:
+        with connection.cursor() as cursor:
+            # Writes to the chunk wait until it is dropped; reads carry on
+            cursor.execute(f"LOCK TABLE {chunk} IN SHARE MODE")
+            cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv)", csv_file)
+        csv_file.flush()
+
+        db = _connect()
+        columns = "{" + ", ".join(f"'{name}': '{type_}'" for name, type_ in COLUMNS.items()) + "}"
+        db.execute(f"CREATE TEMP TABLE chunk AS SELECT * FROM read_csv({_literal(csv_file.name)}, columns = {columns})")
+        row_count = db.execute("SELECT count(*) FROM chunk").fetchone()[0]
+        if row_count:
+            if not _is_remote():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db.execute(
+                f"COPY chunk TO {_literal(path)} (FORMAT parquet, PARTITION_BY (user_id), OVERWRITE_OR_IGNORE true)"
+            )
+
+        cold_chunk = ColdChunk.objects.create(
+            chunk_name=chunk_name, range_start=range_start, range_end=range_end, row_count=row_count, path=path
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT drop_chunks(%s, older_than => %s, newer_than => %s)",
+                [TimeSeriesData._meta.db_table, range_end, range_start],
+            )
+
+    logger.info(f"Archived {chunk_name} ({row_count} rows) to {path}")
+    return cold_chunk
+
+
+def aggregate(user_id, session_ids, metric_type, interval, agg_func_name, start, end, split, recent_rows, fields=None):
+    """Bucket and aggregate one series over [start, split) from Parquet, newest bucket first.
+
+    `split` is the first bucket boundary after the archived range; `recent_rows` are the (time, value)
+    rows of the database between the archive end and `split`, so the bucket straddling the boundary is
+    aggregated in one place. `fields` works as in `hot_tier.aggregate_points`. Only rows of
+    `session_ids` are read, which hides sessions deleted after their chunks were archived.
+    """
+    agg = DUCKDB_AGGREGATES[agg_func_name]
+    columns = {field: ("value_num" if field == "value" else field) for field in fields} if fields else None
+    selects = ", ".join(
+        f"{agg.format(column)} AS {field}" for field, column in (columns or {"value": "value_text"}).items()
+    )
+
+    db = _connect()
+    db.execute(
+        "CREATE TEMP TABLE recent (time TIMESTAMP, value_num DOUBLE, value_text VARCHAR, r DOUBLE, g DOUBLE, b DOUBLE)"
+    )
+    if recent_rows:
+        db.executemany("INSERT INTO recent VALUES (?, ?, ?, ?, ?, ?)", [_flatten(t, v) for t, v in recent_rows])
+
+    where, params = ["user_id = ?", "series_id = ?", "list_contains(?, session_id)", "time < ?"], []
+    params.extend([str(user_id), metric_type.id, [str(s) for s in session_ids], _naive_utc(split)])
+    if start:
+        where.append("time >= ?")
+        params.append(_naive_utc(start))
+    if end:
+        where.append("time <= ?")
+        params.append(_naive_utc(end))
+
+    sources = "SELECT time, value_num, value_text, r, g, b FROM recent"
+    paths = _paths(start, split)
+    if paths:
+        files = "[" + ", ".join(_literal(_join(p, "*", "*.parquet")) for p in paths) + "]"
+        sources = (
+            f"SELECT time, value_num, value_text, r, g, b "
+            f"FROM read_parquet({files}, hive_partitioning = true, hive_types = {{'user_id': VARCHAR}}) "
+            f"WHERE {' AND '.join(where)} UNION ALL {sources}"
+        )
+    else:
+        params = []
+
+    rows = db.execute(
+        f"SELECT time_bucket(INTERVAL '{interval.sql}', time) AS bucket, {selects} "
+        f"FROM ({sources}) GROUP BY bucket ORDER BY bucket DESC",
+        params,
+    ).fetchall()
+
+    names = list(columns or ["value"])
+    return [
+        {"bucket": row[0].replace(tzinfo=dt_timezone.utc), "series": metric_type.series, **dict(zip(names, row[1:]))}
+        for row in rows
+    ]
+
+
+def _paths(start, end):
+    chunks = ColdChunk.objects.filter(range_start__lt=end, row_count__gt=0)
+    if start:
+        chunks = chunks.filter(range_end__gt=start)
+    return list(chunks.values_list("path", flat=True))
+
+
+def _flatten(time, value):
+    """A database row in the Parquet column layout, as `_archive_chunk` extracts it"""
+    numbers = {
+        column: float(value[key]) if isinstance(value.get(key), (int, float)) else None
+        for column, key in NUMERIC_KEYS.items()
+    }
+    text = value.get("value")
+    if text is not None and not isinstance(text, str):
+        text = str(text).lower() if isinstance(text, bool) else str(text)
+    return (_naive_utc(time), numbers["value_num"], text, numbers["r"], numbers["g"], numbers["b"])
+
+
+def _naive_utc(dt):
+    return dt.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+
+def _connect():
+    """In-memory DuckDB connection, with S3 access configured when cold storage lives in a bucket"""
+    import duckdb
+
+    db = duckdb.connect()
+    if _is_remote():
+        db.execute("INSTALL httpfs")
+        db.execute("LOAD httpfs")
+        for option, value in settings.COLD_STORAGE_S3_OPTIONS.items():
+            if value:
+                db.execute(f"SET {option} = {_literal(value)}")
+    return db
+
+
+def _is_remote():
+    return settings.COLD_STORAGE_URL.startswith("s3://")
+
+
+def _join(*parts):
+    return "/".join(part.rstrip("/") for part in parts)
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
@@ -0,0 +1,40 @@
+import numpy as np
+
+CORRELATION_METHODS = ("pearson", "spearman")
+
+# Pairs with fewer shared buckets than this get no coefficient
+MIN_PAIRED_BUCKETS = 3
+
+
+def correlate(columns, method="pearson"):
+    """Pairwise correlation of aligned numeric columns (name -> values per bucket, None where empty).
+
+    Each pair is computed over the buckets where both columns have a value, so series sampled at different
+    rates are compared only where they overlap. Constant columns have no coefficient.
+    """
+    values = {
+        name: np.array([np.nan if v is None else v for v in column], dtype=float) for name, column in columns.items()
+    }
+    names = list(values)
+    pairs = []
+    for i, a in enumerate(names):
+        for b in names[i + 1:]:
+            both = ~np.isnan(values[a]) & ~np.isnan(values[b])
+            x, y = values[a][both], values[b][both]
+            coefficient = None
+            if len(x) >= MIN_PAIRED_BUCKETS:
+                if method == "spearman":
+                    x, y = _rank(x), _rank(y)
+                if x.std() and y.std():
+                    coefficient = round(float(np.corrcoef(x, y)[0, 1]), 4)
+            pairs.append({"a": a, "b": b, "coefficient": coefficient, "buckets": len(x)})
+    return pairs
+
+
+def _rank(values):
+    """1-based ranks with ties given their average rank"""
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    _, groups = np.unique(values, return_inverse=True)
+    return (np.bincount(groups, weights=ranks) / np.bincount(groups))[groups]
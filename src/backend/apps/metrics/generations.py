@@ -0,0 +1,99 @@
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.exceptions import ValidationError
+from urllib.parse import urlencode
+import hashlib
+import logging
+import time
+import uuid
+
+from .intervals import Interval
+from .models import Session
+from .sharding import current_shard
+from .signals import time_range_changed
+
+logger = logging.getLogger(__name__)
+
+# Per-user data generation: a hash with the generation number and the time it last changed
+GENERATION_KEY = "timeseries:generation:{user_id}"
+
+# Bump when the response format changes so validators issued by older code stop matching
+RESPONSE_VERSION = 1
+
+
+def get_generation(user_id):
+    """(generation, last modified) of a user's data, or None when Redis is unavailable.
+
+    Keys that are missing (new users, evicted keys) are seeded from the clock rather than zero, so a
+    recreated key never repeats a generation handed out before.
+    """
+    key = _key(user_id)
+    try:
+        redis = get_redis_connection("default")
+        generation, modified = redis.hmget(key, "generation", "modified")
+        if generation is None:
+            now = time.time()
+            redis.hsetnx(key, "generation", int(now * 1000))
+            redis.hsetnx(key, "modified", now)
+            generation, modified = redis.hmget(key, "generation", "modified")
+    except RedisError as e:
+        logger.warning(f"Data generation unavailable for user {user_id}: {e}")
+        return None
+    return int(generation), datetime.fromtimestamp(float(modified), tz=dt_timezone.utc)
+
+
+def bump_generation(user_id):
+    """Mark a user's data as changed; cached responses and issued validators stop matching"""
+    key = _key(user_id)
+    try:
+        redis = get_redis_connection("default")
+        pipe = redis.pipeline()
+        pipe.hsetnx(key, "generation", int(time.time() * 1000))
+        pipe.hincrby(key, "generation", 1)
+        pipe.hset(key, "modified", time.time())
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not bump data generation for user {user_id}: {e}")
+
+
+def _key(user_id):
+    # Query strings may spell the UUID differently from the stored one
+    return GENERATION_KEY.format(user_id=uuid.UUID(str(user_id)))
+
+
+def bump_on_commit(user_id, using=None):
+    transaction.on_commit(lambda: bump_generation(user_id), using=using or current_shard())
+
+
+def normalized_query(params):
+    """Canonical query string of a timeseries request, so equivalent URLs share validators and cache entries"""
+    query = {"interval": "week", "agg_func": "avg"}
+    query.update({key: params.get(key) for key in params if params.get(key)})
+    try:
+        query["interval"] = str(Interval.parse(query["interval"]))
+    except ValidationError:
+        pass
+    query["agg_func"] = query["agg_func"].lower()
+    if "series" in query:
+        query["series"] = ",".join(sorted({s.strip() for s in query["series"].split(",")}))
+    return urlencode(sorted(query.items()))
+
+
+def etag(user_id, generation, params):
+    digest = hashlib.sha1(f"{RESPONSE_VERSION}:{user_id}:{generation}:{normalized_query(params)}".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+@receiver(post_delete, sender=Session)
+def bump_deleted_session(sender, instance, using=None, **kwargs):
+    bump_on_commit(instance.user_id, using=using)
+
+
+@receiver(time_range_changed)
+def bump_refreshed_range(sender, user_id, **kwargs):
+    # Refreshed rollups can take over queries that read raw rows before
+    bump_on_commit(user_id)
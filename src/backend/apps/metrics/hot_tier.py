@@ -0,0 +1,201 @@
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+import json
+import logging
+import time
+
+import numpy as np
+
+from .intervals import TIMESCALE_ORIGIN
+from .models import Session
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "timeseries:hot"
+
+# Redis layout, per user:
+#   {prefix}:{user}:since           time from which the user's recent points are complete
+#   {prefix}:{user}:series          set of series with recent points
+#   {prefix}:{user}:{series}        sorted set of points scored by epoch seconds
+#   {prefix}:{user}:{series}:floor  oldest retained score, once the set was trimmed by size
+SINCE_TTL = 60 * 60 * 24 * 7
+
+
+def _key(user_id, *parts):
+    return ":".join([KEY_PREFIX, str(user_id), *parts])
+
+
+def record_points(user_id, session_id, points):
+    """Add freshly ingested (series, time, value) points to the user's recent-points buffers.
+
+    Points older than the hot horizon are skipped; buffers are trimmed by age and to
+    `HOT_TIER_MAX_POINTS` per series. Failures are logged and never fail the ingest.
+    """
+    now = time.time()
+    horizon = settings.HOT_TIER_HORIZON.total_seconds()
+    cutoff = now - horizon
+
+    by_series = {}
+    for series, point_time, value in points:
+        score = point_time.timestamp()
+        if score >= cutoff:
+            member = json.dumps({"s": str(session_id), "t": score, "v": value}, sort_keys=True)
+            by_series.setdefault(series, {})[member] = score
+    if not by_series:
+        return
+
+    try:
+        redis = get_redis_connection("default")
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(_key(user_id, "since"), now, nx=True)
+        pipe.expire(_key(user_id, "since"), SINCE_TTL)
+        pipe.sadd(_key(user_id, "series"), *by_series)
+        pipe.expire(_key(user_id, "series"), int(horizon) * 2)
+        for series, members in by_series.items():
+            key = _key(user_id, series)
+            pipe.zadd(key, members)
+            pipe.zremrangebyscore(key, "-inf", cutoff)
+            pipe.zremrangebyrank(key, 0, -settings.HOT_TIER_MAX_POINTS - 1)
+            pipe.expire(key, int(horizon) * 2)
+        results = pipe.execute()
+
+        # Trimming by size drops points inside the horizon; remember where each series is complete from
+        for index, series in enumerate(by_series):
+            if results[4 + index * 4 + 2]:
+                oldest = redis.zrange(_key(user_id, series), 0, 0, withscores=True)
+                if oldest:
+                    redis.set(_key(user_id, series, "floor"), oldest[0][1], ex=int(horizon) * 2)
+    except RedisError as e:
+        logger.warning(f"Hot tier write failed for user {user_id}: {e}")
+
+
+def invalidate_user(user_id):
+    """Drop a user's buffers after points were changed or deleted; they refill from the next ingest"""
+    try:
+        redis = get_redis_connection("default")
+        series = redis.smembers(_key(user_id, "series"))
+        keys = [_key(user_id, s.decode()) for s in series] + [_key(user_id, "series")]
+        pipe = redis.pipeline(transaction=False)
+        pipe.delete(*keys)
+        pipe.set(_key(user_id, "since"), time.time(), ex=SINCE_TTL)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Hot tier invalidation failed for user {user_id}: {e}")
+
+
+@receiver(post_delete, sender=Session)
+def invalidate_deleted_session(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+def covers(user_id, series_names, start, end):
+    """True when the buffers hold every point of these series in [start, end]"""
+    if start is None:
+        return False
+    now = time.time()
+    if start.timestamp() < now - settings.HOT_TIER_HORIZON.total_seconds():
+        return False
+    if end is not None and end.timestamp() > now:
+        return False
+
+    try:
+        redis = get_redis_connection("default")
+        since, *floors = redis.mget([_key(user_id, "since")] + [_key(user_id, s, "floor") for s in series_names])
+    except RedisError as e:
+        logger.warning(f"Hot tier unavailable: {e}")
+        return False
+
+    if since is None or start.timestamp() < float(since):
+        return False
+    return all(floor is None or start.timestamp() >= float(floor) for floor in floors)
+
+
+def get_points(user_id, series, start, end, session_id=None):
+    """(epoch seconds, value dict) pairs of one series in [start, end], oldest first"""
+    redis = get_redis_connection("default")
+    members = redis.zrangebyscore(_key(user_id, series), start.timestamp(), end.timestamp() if end else "+inf")
+    points = []
+    for member in members:
+        point = json.loads(member)
+        if session_id is None or point["s"] == str(session_id):
+            points.append((point["t"], point["v"]))
+    return points
+
+
+def aggregate_points(points, series, interval, agg_func_name, fields=None):
+    """Bucket points the way time_bucket does and aggregate them, newest bucket first.
+
+    `fields` lists the numeric keys to aggregate with NumPy (["value"] or ["r", "g", "b"]);
+    without it the series is treated as text and aggregated from `value`.
+    """
+    if not points:
+        return []
+
+    step = interval.duration.total_seconds()
+    origin = TIMESCALE_ORIGIN.timestamp()
+    times = np.fromiter((p[0] for p in points), dtype=float, count=len(points))
+    buckets, inverse = np.unique(np.floor((times - origin) / step).astype(np.int64), return_inverse=True)
+
+    rows = [
+        {"bucket": datetime.fromtimestamp(origin + b * step, tz=dt_timezone.utc), "series": series} for b in buckets
+    ]
+    for field in fields or ["value"]:
+        values = [p[1].get(field) for p in points]
+        if fields:
+            aggregated = _aggregate_numeric(np.array(values, dtype=float), times, inverse, len(buckets), agg_func_name)
+        else:
+            aggregated = _aggregate_text(values, times, inverse, len(buckets), agg_func_name)
+        for row, value in zip(rows, aggregated):
+            row[field] = value
+    return rows[::-1]
+
+
+def _aggregate_numeric(values, times, inverse, n, agg_func_name):
+    valid = ~np.isnan(values)
+    values, times, inverse = values[valid], times[valid], inverse[valid]
+    counts = np.bincount(inverse, minlength=n)
+
+    if agg_func_name == "count":
+        return counts.tolist()
+    if agg_func_name == "avg":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.bincount(inverse, weights=values, minlength=n) / counts
+    elif agg_func_name in ("min", "max"):
+        result = np.full(n, np.inf if agg_func_name == "min" else -np.inf)
+        (np.minimum if agg_func_name == "min" else np.maximum).at(result, inverse, values)
+    elif agg_func_name in ("first", "last"):
+        result = np.full(n, np.nan)
+        order = np.lexsort((times, inverse))
+        if agg_func_name == "last":
+            order = order[::-1]
+        sorted_groups = inverse[order]
+        # With rows grouped by bucket, the first row of each group is the earliest (or latest) point
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_groups)) + 1] if len(order) else np.array([], dtype=int)
+        result[sorted_groups[starts]] = values[order][starts]
+    else:
+        return _aggregate_text(values.tolist(), times, inverse, n, agg_func_name)
+
+    return [None if counts[i] == 0 or np.isnan(v) else float(v) for i, v in enumerate(result)]
+
+
+def _aggregate_text(values, times, inverse, n, agg_func_name):
+    groups = [[] for _ in range(n)]
+    for index in np.argsort(times, kind="stable"):
+        if values[index] is not None:
+            groups[inverse[index]].append(values[index])
+
+    if agg_func_name == "count":
+        return [len(g) for g in groups]
+    if agg_func_name == "count_distinct":
+        return [len(set(g)) for g in groups]
+    if agg_func_name == "mode":
+        # Ties resolve to the smallest value, as MODE() WITHIN GROUP does
+        return [min(Counter(g).most_common(), key=lambda c: (-c[1], c[0]))[0] if g else None for g in groups]
+    if agg_func_name == "last":
+        return [g[-1] if g else None for g in groups]
+    return [g[0] if g else None for g in groups]
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+import hashlib
+import json
+import uuid
+
+# Stored results are scoped to the uploading user, so keys reused by different clients never collide
+CACHE_KEY = "idempotency:sessions:{user}:{key}"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request body."
+    default_code = "idempotency_key_reused"
+
+
+class Replay(Exception):
+    """Raised before anything is written when an upload's key already has a stored result"""
+
+    def __init__(self, entry):
+        self.entry = entry
+
+
+def scope(user_id):
+    try:
+        return str(uuid.UUID(str(user_id)))
+    except ValueError:
+        # Uploads without a (valid) user share one scope; the body digest still tells them apart
+        return "-"
+
+
+def digest(data):
+    """Digest of an already parsed body"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def lookup(user_id, key):
+    return cache.get(CACHE_KEY.format(user=scope(user_id), key=key))
+
+
+def store(user_id, key, body_digest, response):
+    cache.set(
+        CACHE_KEY.format(user=scope(user_id), key=key),
+        {"digest": body_digest, "data": response.data, "status": response.status_code},
+        timeout=settings.IDEMPOTENCY_KEY_TTL,
+    )
+
+
+def replay(entry, body_digest):
+    """The stored response, if the retry carries the same body as the original upload"""
+    if entry["digest"] != body_digest:
+        raise IdempotencyKeyReused()
+    return Response(entry["data"], status=entry["status"], headers={"Idempotent-Replayed": "true"})
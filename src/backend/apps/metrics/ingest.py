@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+import json
+import logging
+
+from . import hot_tier
+from .generations import bump_on_commit
+from .cold_storage import archived_until
+from .models import DirtyRange, MetricType, SeriesStats, Session, SessionSummary, TimeSeriesData
+from .sharding import (
+    ShardMoved,
+    current_shard,
+    lock_user,
+    pin_user,
+    shard_connection,
+    shard_for_user,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SessionWriter:
+    """Idempotent bulk write path for one session.
+
+    Sessions are keyed on `session_id` and points on `(session, series, time)`. Points are written
+    with `INSERT ... ON CONFLICT DO UPDATE`, and unchanged values are skipped entirely, so a retried
+    upload rewrites nothing and is not counted twice in the session summary.
+
+    Writes go to the active shard, which must be the user's shard.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, user_id=None, session_id=None, start_ts=None):
+        if user_id:
+            # Rebalancing takes this lock exclusively, so the user can't move while the write is open
+            lock_user(user_id)
+            if shard_for_user(user_id) != current_shard():
+                raise ShardMoved()
+
+        defaults = {"start_ts": start_ts}
+        if user_id:
+            defaults["user_id"] = user_id
+        if session_id:
+            self.session, self.created = Session.objects.get_or_create(session_id=session_id, defaults=defaults)
+        else:
+            self.session, self.created = Session.objects.create(**defaults), True
+
+        if not self.created and user_id and self.session.user_id != user_id:
+            raise ValidationError({"session_id": "Session belongs to another user."})
+
+        if self.created:
+            pin_user(self.session.user_id, current_shard())
+            self.summary = SessionSummary(session=self.session)
+        else:
+            try:
+                self.summary = SessionSummary.objects.select_for_update().get(session=self.session)
+            except SessionSummary.DoesNotExist:
+                # Sessions ingested before summaries existed start from their stored points
+                self.summary = SessionSummary.rebuild(self.session)
+        self._metric_types = {}
+        self._series_stats = {}
+        self._dirty = {}
+        self._hot_points = []
+        self._hot_points_changed = False
+        self._archived_until = archived_until()
+
+    def write(self, points):
+        """Upsert an iterable of validated points ({"series", "time", "value"}) in batches."""
+        batch = []
+        for point in points:
+            batch.append(point)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def finish(self):
+        """Persist the session summary once all points are written"""
+        if self.session.start_ts is None and self.summary.first_time:
+            self.session.start_ts = self.summary.first_time
+            self.session.save(update_fields=["start_ts"])
+        self.summary.save()
+        DirtyRange.objects.bulk_create(
+            DirtyRange(user_id=self.session.user_id, series_id=series_id, start=start, end=end)
+            for series_id, (start, end) in self._dirty.items()
+        )
+        if self._series_stats:
+            SeriesStats.record(self.session.user_id, self._series_stats.values())
+
+        # Recent points feed the Redis hot tier once the data is committed
+        user_id, session_id = self.session.user_id, self.session.session_id
+        if self._hot_points_changed:
+            transaction.on_commit(lambda: hot_tier.invalidate_user(user_id), using=current_shard())
+        elif self._hot_points:
+            hot_points = self._hot_points
+            transaction.on_commit(
+                lambda: hot_tier.record_points(user_id, session_id, hot_points), using=current_shard()
+            )
+        # Commit callbacks run in order: the generation moves only once the hot tier holds the new points, so
+        # a request validated against the new generation can't read the old buffer
+        if self._dirty:
+            bump_on_commit(user_id)
+        return self.session
+
+    def _get_metric_types(self, names):
+        missing = set(names) - self._metric_types.keys()
+        if missing:
+            self._metric_types.update({mt.series: mt for mt in MetricType.objects.filter(series__in=missing)})
+        return self._metric_types
+
+    def _write_batch(self, points):
+        if self._archived_until and any(point["time"] < self._archived_until for point in points):
+            raise ValidationError(
+                {"data": f"Points before {self._archived_until.isoformat()} are archived and read-only."}
+            )
+        metric_types = self._get_metric_types({point["series"] for point in points})
+
+        # A payload may repeat a (series, time) pair; the last value wins, as it would across retries
+        values = {}
+        for point in points:
+            metric_type = metric_types[point["series"]]
+            values[(metric_type.id, point["time"])] = point["value"]
+
+        written = self._upsert({key: json.dumps(value) for key, value in values.items()})
+        series_names = {mt.id: mt.series for mt in metric_types.values()}
+        self.summary.add_points((series_names[series_id], time) for series_id, time, inserted in written if inserted)
+
+        numeric_fields = {mt.id: mt.numeric_fields for mt in metric_types.values()}
+        for series_id, time, inserted in written:
+            stats = self._series_stats.setdefault(
+                series_id, SeriesStats(user_id=self.session.user_id, series_id=series_id)
+            )
+            stats.add_point(time, values[(series_id, time)], numeric_fields[series_id], inserted)
+
+        hot_cutoff = timezone.now() - settings.HOT_TIER_HORIZON
+        for series_id, time, inserted in written:
+            if time >= hot_cutoff:
+                # A changed value can't be swapped in place in the buffer, so it is rebuilt instead
+                self._hot_points_changed |= not inserted
+                self._hot_points.append((series_names[series_id], time, values[(series_id, time)]))
+
+        # Late points land in already-aggregated time; log what changed so only that range is refreshed
+        for series_id, time, _ in written:
+            start, end = self._dirty.get(series_id, (time, time))
+            self._dirty[series_id] = (min(start, time), max(end, time))
+        return written
+
+    def _upsert(self, rows):
+        """Insert or update rows keyed on (series_id, time); returns (series_id, time, inserted) for changed rows."""
+        session_id = self.session.session_id
+        return upsert_points(
+            shard_connection(), [(session_id, series_id, time, value) for (series_id, time), value in rows.items()]
+        )
+
+
+def upsert_points(connection, rows):
+    """Upsert (session_id, series_id, time, JSON value) rows, skipping unchanged values.
+
+    Returns (series_id, time, inserted) for every row that was inserted or changed.
+    """
+    table = connection.ops.quote_name(TimeSeriesData._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s::jsonb)"] * len(rows))
+    params = [param for row in rows for param in row]
+
+    sql = (
+        f"INSERT INTO {table} (session_id, series_id, time, value) VALUES {values} "
+        f"ON CONFLICT (session_id, series_id, time) DO UPDATE SET value = EXCLUDED.value "
+        f"WHERE {table}.value IS DISTINCT FROM EXCLUDED.value "
+        f"RETURNING series_id, time, (xmax = 0) AS inserted"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from rest_framework.exceptions import ValidationError
+import re
+
+INTERVAL_PATTERN = re.compile(r"^(\d+)\s*(m|min|h|d|w|mo)$")
+
+# unit: (SQL unit, approximate duration); months are calendar buckets, costed as 30 days
+UNITS = {
+    "m": ("minute", timedelta(minutes=1)),
+    "h": ("hour", timedelta(hours=1)),
+    "d": ("day", timedelta(days=1)),
+    "w": ("week", timedelta(weeks=1)),
+    "mo": ("month", timedelta(days=30)),
+}
+UNIT_ALIASES = {"min": "m"}
+
+# Named intervals accepted before arbitrary intervals were supported
+LEGACY_NAMES = {"min": "1m", "hour": "1h", "day": "1d", "week": "1w", "month": "1mo"}
+
+# time_bucket's default origin for sub-month intervals (a Monday); fixed-width buckets are aligned to it
+TIMESCALE_ORIGIN = datetime(2000, 1, 3, tzinfo=dt_timezone.utc)
+
+MAX_DURATION = timedelta(days=366 * 10)
+
+
+class Interval:
+    """A validated, normalized bucket width such as `5m`, `1h`, `3d` or `1mo`"""
+
+    def __init__(self, count, unit):
+        self.count = count
+        self.unit = unit
+
+    @classmethod
+    def parse(cls, value):
+        value = LEGACY_NAMES.get(value, value)
+        match = INTERVAL_PATTERN.match((value or "").strip().lower())
+        if not match or int(match.group(1)) < 1:
+            raise ValidationError(
+                {"interval": "Invalid interval. Use <count><unit> with unit m, h, d, w or mo, e.g. 5m, 1h, 3d."}
+            )
+
+        count, unit = int(match.group(1)), UNIT_ALIASES.get(match.group(2), match.group(2))
+        # Compared before multiplying: timedelta overflows on counts with enough digits
+        if count > MAX_DURATION // UNITS[unit][1]:
+            raise ValidationError({"interval": "Interval is too large."})
+        return cls(count, unit)._normalized()
+
+    def _normalized(self):
+        """Express fixed-width intervals in the largest unit that divides them, so 60m == 1h"""
+        if self.is_calendar:
+            return self
+        for unit in ("w", "d", "h", "m"):
+            size = UNITS[unit][1]
+            if self.duration % size == timedelta(0):
+                return Interval(self.duration // size, unit)
+        return self
+
+    @property
+    def duration(self):
+        return self.count * UNITS[self.unit][1]
+
+    @property
+    def is_calendar(self):
+        return self.unit == "mo"
+
+    @property
+    def sql(self):
+        """Interval literal for time_bucket, e.g. '5 minute'"""
+        return f"{self.count} {UNITS[self.unit][0]}"
+
+    def is_multiple_of(self, other):
+        """True when every bucket of this interval is made of whole `other` buckets"""
+        if other.is_calendar:
+            return self.is_calendar and self.count % other.count == 0
+        if self.is_calendar:
+            # Month boundaries are UTC midnights, so any width that divides a day nests inside them
+            return timedelta(days=1) % other.duration == timedelta(0)
+        return self.duration % other.duration == timedelta(0)
+
+    def floor(self, dt):
+        """Start of the bucket containing `dt`, matching time_bucket's alignment"""
+        if self.is_calendar:
+            months = _months_since_origin(dt)
+            return _month_start(months - months % self.count)
+        return TIMESCALE_ORIGIN + ((dt - TIMESCALE_ORIGIN) // self.duration) * self.duration
+
+    def ceil(self, dt):
+        """First bucket boundary at or after `dt`"""
+        start = self.floor(dt)
+        if start == dt:
+            return start
+        if self.is_calendar:
+            return _month_start(_months_since_origin(start) + self.count)
+        return start + self.duration
+
+    def bucket_number(self, dt):
+        """Index of the bucket containing `dt`, counted from time_bucket's origin"""
+        if self.is_calendar:
+            return _months_since_origin(dt) // self.count
+        return (dt - TIMESCALE_ORIGIN) // self.duration
+
+    def bucket_start(self, number):
+        """Start of the bucket with index `number`; the inverse of bucket_number"""
+        if self.is_calendar:
+            return _month_start(number * self.count)
+        return TIMESCALE_ORIGIN + number * self.duration
+
+    def __eq__(self, other):
+        return isinstance(other, Interval) and (self.count, self.unit) == (other.count, other.unit)
+
+    def __hash__(self):
+        return hash((self.count, self.unit))
+
+    def __str__(self):
+        return f"{self.count}{self.unit}"
+
+    def __repr__(self):
+        return f"Interval({self})"
+
+
+def _months_since_origin(dt):
+    """Whole months between time_bucket's month origin (2000-01-01 UTC) and `dt`"""
+    dt = dt.astimezone(dt_timezone.utc)
+    return (dt.year - 2000) * 12 + dt.month - 1
+
+
+def _month_start(months):
+    return datetime(2000 + months // 12, months % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+# Intervals the planner may coarsen to, finest first
+COARSENING_LADDER = [Interval.parse(i) for i in ("1m", "5m", "15m", "1h", "6h", "1d", "1w", "1mo")]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionSummary',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='metrics.session')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('first_time', models.DateTimeField(blank=True, null=True)),
+                ('last_time', models.DateTimeField(blank=True, null=True)),
+                ('series', models.JSONField(default=dict, help_text='Per-series count, first_time and last_time')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user_id', '-start_ts'], name='metrics_ses_user_id_2f576d_idx'),
+        ),
+    ]
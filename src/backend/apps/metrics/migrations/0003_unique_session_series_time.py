@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0002_sessionsummary'),
+    ]
+
+    operations = [
+        # Uploads before this constraint could repeat a (session, series, time) point; keep the newest write of each
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM metrics_timeseriesdata older
+                USING metrics_timeseriesdata newer
+                WHERE older.session_id = newer.session_id
+                  AND older.series_id = newer.series_id
+                  AND older.time = newer.time
+                  AND older.id < newer.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+            hints={"model_name": "timeseriesdata"},
+        ),
+        migrations.AddConstraint(
+            model_name='timeseriesdata',
+            constraint=models.UniqueConstraint(fields=('session', 'series', 'time'), name='unique_session_series_time'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0003_unique_session_series_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='metrics.metrictype')),
+            ],
+        ),
+    ]
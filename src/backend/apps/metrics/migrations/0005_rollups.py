@@ -0,0 +1,94 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:22
+
+import django.db.models.deletion
+import timescale.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0004_dirtyrange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('field', models.CharField(help_text='JSON key of the aggregated value, e.g. value or r', max_length=32)),
+                ('count', models.BigIntegerField()),
+                ('sum', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('time', timescale.db.models.fields.TimescaleDateTimeField(interval='52 weeks')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HourRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('field', models.CharField(help_text='JSON key of the aggregated value, e.g. value or r', max_length=32)),
+                ('count', models.BigIntegerField()),
+                ('sum', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('time', timescale.db.models.fields.TimescaleDateTimeField(interval='4 weeks')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MinuteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('field', models.CharField(help_text='JSON key of the aggregated value, e.g. value or r', max_length=32)),
+                ('count', models.BigIntegerField()),
+                ('sum', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('time', timescale.db.models.fields.TimescaleDateTimeField(interval='1 week')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dirtyrange',
+            index=models.Index(fields=['user_id', 'series'], name='metrics_dir_user_id_5b6e5c_idx'),
+        ),
+        migrations.AddField(
+            model_name='dayrollup',
+            name='series',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metrics.metrictype'),
+        ),
+        migrations.AddField(
+            model_name='hourrollup',
+            name='series',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metrics.metrictype'),
+        ),
+        migrations.AddField(
+            model_name='minuterollup',
+            name='series',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metrics.metrictype'),
+        ),
+        migrations.AddConstraint(
+            model_name='dayrollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'series', 'field', 'time'), name='unique_dayrollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourrollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'series', 'field', 'time'), name='unique_hourrollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='minuterollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'series', 'field', 'time'), name='unique_minuterollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Queue every existing (user, series) range in the dirty-range log so the refresh job builds its rollups.
+
+    Until a range has been refreshed, queries over it keep reading raw rows.
+    """
+
+    dependencies = [
+        ('metrics', '0005_rollups'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO metrics_dirtyrange (user_id, series_id, start, "end", created_at)
+                SELECT s.user_id, t.series_id, MIN(t.time), MAX(t.time), NOW()
+                FROM metrics_timeseriesdata t
+                JOIN metrics_session s ON s.session_id = t.session_id
+                GROUP BY s.user_id, t.series_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
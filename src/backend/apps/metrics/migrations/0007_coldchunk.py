@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0006_backfill_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk_name', models.CharField(max_length=255, unique=True)),
+                ('range_start', models.DateTimeField()),
+                ('range_end', models.DateTimeField()),
+                ('row_count', models.BigIntegerField()),
+                ('path', models.CharField(max_length=1024)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['range_start'],
+            },
+        ),
+    ]
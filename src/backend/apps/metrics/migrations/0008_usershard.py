@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0007_coldchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField(unique=True)),
+                ('alias', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        # Users that already have data on `default` stay there when shards are added
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO metrics_usershard (user_id, alias, updated_at)
+                SELECT DISTINCT user_id, 'default', NOW() FROM metrics_session
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+            hints={"model_name": "usershard"},
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0008_usershard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeriesStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('point_count', models.BigIntegerField(default=0)),
+                ('first_time', models.DateTimeField(blank=True, null=True)),
+                ('last_time', models.DateTimeField(blank=True, null=True)),
+                ('ranges', models.JSONField(default=dict, help_text='min and max of each numeric field, e.g. value or r')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metrics.metrictype')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'series'), name='unique_seriesstats_user_series')],
+            },
+        ),
+        # Built from the hypertable itself, since sessions ingested before summaries existed have none. Points
+        # in chunks already moved to cold storage are not counted.
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO metrics_seriesstats (user_id, series_id, point_count, first_time, last_time, ranges, updated_at)
+                SELECT s.user_id, t.series_id, COUNT(*), MIN(t.time), MAX(t.time), '{}'::jsonb, NOW()
+                FROM metrics_timeseriesdata t
+                JOIN metrics_session s ON s.session_id = t.session_id
+                GROUP BY s.user_id, t.series_id;
+
+                UPDATE metrics_seriesstats st SET ranges = r.ranges
+                FROM (
+                    SELECT user_id, series_id, jsonb_object_agg(field, jsonb_build_object('min', min, 'max', max)) AS ranges
+                    FROM (
+                        SELECT s.user_id, t.series_id, f.field,
+                               MIN((t.value ->> f.field)::float) AS min, MAX((t.value ->> f.field)::float) AS max
+                        FROM metrics_timeseriesdata t
+                        JOIN metrics_session s ON s.session_id = t.session_id
+                        JOIN metrics_metrictype m ON m.id = t.series_id
+                        CROSS JOIN LATERAL jsonb_each(m.schema -> 'properties') AS f(field, spec)
+                        WHERE f.spec ->> 'type' IN ('number', 'integer')
+                        GROUP BY s.user_id, t.series_id, f.field
+                    ) by_field
+                    WHERE min IS NOT NULL
+                    GROUP BY user_id, series_id
+                ) r
+                WHERE st.user_id = r.user_id AND st.series_id = r.series_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+            hints={"model_name": "seriesstats"},
+        ),
+    ]
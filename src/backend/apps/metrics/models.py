@@ -2,6 +2,11 @@ from timescale.db.models.models import TimescaleModel
 from timescale.db.models.fields import TimescaleDateTimeField
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.db.models import Count, FloatField, Max, Min
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import uuid
 import jsonschema
 import logging
@@ -28,6 +33,12 @@ class MetricType(models.Model):
     def __str__(self):
         return self.series
 
+    @property
+    def numeric_fields(self):
+        """JSON keys holding numbers that can be summed and averaged, e.g. ["value"] or ["r", "g", "b"]"""
+        properties = self.schema.get("properties", {})
+        return [key for key, spec in properties.items() if spec.get("type") in ("number", "integer")]
+
     class Meta:
         indexes = [
             models.Index(fields=["series"]),
@@ -46,6 +57,9 @@ class Session(models.Model):
 
     class Meta:
         ordering = ["-start_ts"]
+        indexes = [
+            models.Index(fields=["user_id", "-start_ts"]),
+        ]
 
 
 class TimeSeriesData(TimescaleModel):
@@ -63,6 +77,10 @@ class TimeSeriesData(TimescaleModel):
         indexes = [
             models.Index(fields=["time", "series", "session"]),
         ]
+        constraints = [
+            # Natural key for idempotent ingest; hypertable unique indexes must include the time column
+            models.UniqueConstraint(fields=["session", "series", "time"], name="unique_session_series_time"),
+        ]
 
     def clean(self):
         """Validates the value against the series schema"""
@@ -76,3 +94,262 @@ class TimeSeriesData(TimescaleModel):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+
+
+class SessionSummary(models.Model):
+    """Per-session statistics maintained at ingest so session listings never aggregate the hypertable"""
+
+    session = models.OneToOneField(Session, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    point_count = models.PositiveIntegerField(default=0)
+    first_time = models.DateTimeField(null=True, blank=True)
+    last_time = models.DateTimeField(null=True, blank=True)
+    series = models.JSONField(default=dict, help_text="Per-series count, first_time and last_time")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.session_id} - {self.point_count} points"
+
+    def add_points(self, points):
+        """Fold an iterable of (series name, time) pairs into the running totals"""
+        for series_name, time in points:
+            self.point_count += 1
+            self.first_time = min(self.first_time, time) if self.first_time else time
+            self.last_time = max(self.last_time, time) if self.last_time else time
+
+            stats = self.series.get(series_name)
+            if stats is None:
+                self.series[series_name] = {"count": 1, "first_time": time.isoformat(), "last_time": time.isoformat()}
+                continue
+            stats["count"] += 1
+            if time < parse_datetime(stats["first_time"]):
+                stats["first_time"] = time.isoformat()
+            if time > parse_datetime(stats["last_time"]):
+                stats["last_time"] = time.isoformat()
+
+    @classmethod
+    def rebuild(cls, session):
+        """Recompute the summary of a session from the hypertable"""
+        rows = (
+            TimeSeriesData.objects.filter(session=session)
+            .values("series__series")
+            .annotate(count=Count("time"), first_time=Min("time"), last_time=Max("time"))
+        )
+        summary = cls(session=session)
+        for row in rows:
+            summary.point_count += row["count"]
+            summary.first_time = min(summary.first_time or row["first_time"], row["first_time"])
+            summary.last_time = max(summary.last_time or row["last_time"], row["last_time"])
+            summary.series[row["series__series"]] = {
+                "count": row["count"],
+                "first_time": row["first_time"].isoformat(),
+                "last_time": row["last_time"].isoformat(),
+            }
+        summary.save()
+        return summary
+
+
+class SeriesStats(models.Model):
+    """Per-(user, series) point count, time span and numeric value ranges maintained at ingest.
+
+    Queries use it to find the series a user has data for in a window without scanning the hypertable.
+    Counts drop when sessions are deleted, but the span and ranges only ever widen, so they bound the
+    stored data rather than describe it exactly.
+    """
+
+    user_id = models.UUIDField()
+    series = models.ForeignKey(MetricType, on_delete=models.CASCADE, related_name="+")
+    point_count = models.BigIntegerField(default=0)
+    first_time = models.DateTimeField(null=True, blank=True)
+    last_time = models.DateTimeField(null=True, blank=True)
+    ranges = models.JSONField(default=dict, help_text="min and max of each numeric field, e.g. value or r")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.series_id} - {self.point_count} points"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_id", "series"], name="unique_seriesstats_user_series"),
+        ]
+
+    def add_point(self, time, value, fields, inserted=True):
+        """Fold one written point into the running totals; rewritten points only widen the ranges"""
+        if inserted:
+            self.point_count += 1
+            self.first_time = min(self.first_time, time) if self.first_time else time
+            self.last_time = max(self.last_time, time) if self.last_time else time
+        for field in fields:
+            number = value.get(field)
+            if not isinstance(number, (int, float)) or isinstance(number, bool):
+                continue
+            bounds = self.ranges.setdefault(field, {"min": number, "max": number})
+            bounds["min"], bounds["max"] = min(bounds["min"], number), max(bounds["max"], number)
+
+    def merge(self, other):
+        self.point_count += other.point_count
+        if other.first_time:
+            self.first_time = min(self.first_time, other.first_time) if self.first_time else other.first_time
+            self.last_time = max(self.last_time, other.last_time) if self.last_time else other.last_time
+        for field, bounds in other.ranges.items():
+            stored = self.ranges.setdefault(field, dict(bounds))
+            stored["min"], stored["max"] = min(stored["min"], bounds["min"]), max(stored["max"], bounds["max"])
+
+    @classmethod
+    def record(cls, user_id, stats):
+        """Merge unsaved per-series stats of one write into the stored rows.
+
+        Rows are locked in series order, so concurrent uploads for the same user serialize per series
+        instead of deadlocking.
+        """
+        series_ids = sorted(s.series_id for s in stats)
+        cls.objects.bulk_create([cls(user_id=user_id, series_id=s) for s in series_ids], ignore_conflicts=True)
+        stored = list(
+            cls.objects.select_for_update().filter(user_id=user_id, series_id__in=series_ids).order_by("series_id")
+        )
+        by_series = {s.series_id: s for s in stats}
+        for row in stored:
+            row.merge(by_series[row.series_id])
+            row.updated_at = timezone.now()
+        cls.objects.bulk_update(stored, ["point_count", "first_time", "last_time", "ranges", "updated_at"])
+
+    @classmethod
+    def rebuild(cls, user_id=None):
+        """Recompute the stats of one user, or of everyone, from the hypertable of the current shard.
+
+        Points in chunks already moved to cold storage are no longer counted. Returns the rows written.
+        """
+        points = TimeSeriesData.objects.all()
+        stored = cls.objects.all()
+        if user_id:
+            points = points.filter(session__user_id=user_id)
+            stored = stored.filter(user_id=user_id)
+
+        rebuilt = []
+        for metric_type in MetricType.objects.all():
+            annotations = {"point_count": Count("time"), "first_time": Min("time"), "last_time": Max("time")}
+            for field in metric_type.numeric_fields:
+                number = Cast(KeyTextTransform(field, "value"), FloatField())
+                annotations[f"min_{field}"], annotations[f"max_{field}"] = Min(number), Max(number)
+            for row in points.filter(series=metric_type).values("session__user_id").annotate(**annotations):
+                rebuilt.append(
+                    cls(
+                        user_id=row["session__user_id"],
+                        series=metric_type,
+                        point_count=row["point_count"],
+                        first_time=row["first_time"],
+                        last_time=row["last_time"],
+                        ranges={
+                            field: {"min": row[f"min_{field}"], "max": row[f"max_{field}"]}
+                            for field in metric_type.numeric_fields
+                            if row[f"min_{field}"] is not None
+                        },
+                    )
+                )
+
+        cls.objects.bulk_create(
+            rebuilt,
+            update_conflicts=True,
+            unique_fields=["user_id", "series"],
+            update_fields=["point_count", "first_time", "last_time", "ranges", "updated_at"],
+        )
+        # Pairs without points left
+        kept = {(row.user_id, row.series_id) for row in rebuilt}
+        stale = [s.id for s in stored.only("user_id", "series") if (s.user_id, s.series_id) not in kept]
+        stored.filter(id__in=stale).delete()
+        return len(rebuilt)
+
+    @classmethod
+    def remove_session(cls, user_id, summary):
+        """Subtract a session's points, taken from its summary, before the session is deleted"""
+        series_ids = dict(MetricType.objects.filter(series__in=summary.series).values_list("id", "series"))
+        stored = list(
+            cls.objects.select_for_update().filter(user_id=user_id, series_id__in=series_ids).order_by("series_id")
+        )
+        for row in stored:
+            row.point_count -= summary.series[series_ids[row.series_id]]["count"]
+            row.updated_at = timezone.now()
+        cls.objects.filter(id__in=[row.id for row in stored if row.point_count <= 0]).delete()
+        cls.objects.bulk_update([row for row in stored if row.point_count > 0], ["point_count", "updated_at"])
+
+
+class DirtyRange(models.Model):
+    """Time range of a (user, series) written by ingest whose derived aggregates and caches are stale"""
+
+    user_id = models.UUIDField()
+    series = models.ForeignKey(MetricType, on_delete=models.CASCADE)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.series_id} - [{self.start}, {self.end}]"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "series"]),
+        ]
+
+
+class Rollup(TimescaleModel):
+    """Composable aggregates (count, sum, min, max) of one numeric field per (user, series, bucket).
+
+    Each concrete subclass stores one resolution of the rollup pyramid; coarser levels are built from
+    the level below, and any bucket interval made of whole stored buckets is answered by re-aggregating them.
+    """
+
+    user_id = models.UUIDField()
+    series = models.ForeignKey(MetricType, on_delete=models.CASCADE, related_name="+")
+    field = models.CharField(max_length=32, help_text="JSON key of the aggregated value, e.g. value or r")
+    count = models.BigIntegerField()
+    sum = models.FloatField()
+    min = models.FloatField()
+    max = models.FloatField()
+
+    def __str__(self):
+        return f"{self.user_id} - {self.series_id}.{self.field} - {self.time}"
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=["user_id", "series", "field", "time"], name="unique_%(class)s_bucket"),
+        ]
+
+
+class MinuteRollup(Rollup):
+    time = TimescaleDateTimeField(interval="1 week")
+
+
+class HourRollup(Rollup):
+    time = TimescaleDateTimeField(interval="4 weeks")
+
+
+class DayRollup(Rollup):
+    time = TimescaleDateTimeField(interval="52 weeks")
+
+
+class ColdChunk(models.Model):
+    """A hypertable chunk exported to Parquet and dropped from the database; its range is read-only"""
+
+    chunk_name = models.CharField(max_length=255, unique=True)
+    range_start = models.DateTimeField()
+    range_end = models.DateTimeField()
+    row_count = models.BigIntegerField()
+    path = models.CharField(max_length=1024)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.chunk_name} [{self.range_start}, {self.range_end})"
+
+    class Meta:
+        ordering = ["range_start"]
+
+
+class UserShard(models.Model):
+    """Database alias holding a user's data; users are pinned at their first ingest and moved by rebalancing"""
+
+    user_id = models.UUIDField(unique=True)
+    alias = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.alias}"
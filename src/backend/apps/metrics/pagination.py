@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SessionCursorPagination(CursorPagination):
+    """Keyset pagination for session listings, newest first.
+
+    The cursor encodes the last `start_ts` seen, so deep pages cost the same as the first one
+    instead of scanning and discarding `offset` rows.
+    """
+
+    ordering = ("-start_ts", "-session_id")
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = "page_size"
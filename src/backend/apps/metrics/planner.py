@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+import math
+
+from .intervals import COARSENING_LADDER, Interval
+from .models import ColdChunk, TimeSeriesData
+from .sharding import current_shard, shard_connection
+
+
+class QueryPlan:
+    """Cost estimate for one aggregation request and the interval it will actually run at"""
+
+    def __init__(self, requested_interval, interval, start, end, series_count, chunks, rows):
+        self.requested_interval = requested_interval
+        self.interval = interval
+        self.start = start
+        self.end = end
+        self.series_count = series_count
+        self.chunks = chunks
+        self.rows = rows
+        self.estimated_buckets = 0
+        self.chunk_starts = []
+
+    @property
+    def coarsened(self):
+        return self.interval != self.requested_interval
+
+    def as_metadata(self):
+        return {
+            "estimated_buckets": self.estimated_buckets,
+            "estimated_chunks": self.chunks,
+            "estimated_rows": self.rows,
+            "requested_interval": str(self.requested_interval),
+            "coarsened": self.coarsened,
+        }
+
+
+class QueryPlanner:
+    """Estimates bucket count and scanned chunks for a time-bucket aggregation and enforces limits.
+
+    The window is clipped to the hypertable's chunk ranges and to `span`, the time range the queried
+    series hold data in, so a request without `start_time` is costed against the stored data rather than
+    treated as free. Requests over `TIMESERIES_MAX_BUCKETS` are moved
+    to the finest coarser interval that fits (when `TIMESERIES_AUTO_COARSEN` is on) or rejected.
+    """
+
+    chunk_stats_cache_key = "timeseries:chunk_stats:{shard}"
+
+    def plan(self, interval, start, end, series_count, span=None):
+        interval = Interval.parse(interval)
+        end = end or timezone.now()
+        if span:
+            start = max(start, span[0]) if start else span[0]
+            end = min(end, span[1])
+        chunks = [c for c in self._chunk_stats() if c[0] <= end and (start is None or c[1] > start)]
+        if chunks:
+            start = max(start, chunks[0][0]) if start else chunks[0][0]
+            end = min(end, chunks[-1][1])
+
+        plan = QueryPlan(interval, interval, start, end, series_count, len(chunks), sum(c[2] for c in chunks))
+        plan.chunk_starts = [c[0] for c in chunks]
+        if plan.chunks > settings.TIMESERIES_MAX_CHUNKS:
+            raise ValidationError(
+                {"start_time": f"Window scans {plan.chunks} chunks (limit {settings.TIMESERIES_MAX_CHUNKS}). Narrow it."}
+            )
+
+        plan.estimated_buckets = self._estimate_buckets(plan, interval)
+        if plan.estimated_buckets <= settings.TIMESERIES_MAX_BUCKETS:
+            return plan
+
+        if settings.TIMESERIES_AUTO_COARSEN:
+            for candidate in self._coarser_than(interval):
+                buckets = self._estimate_buckets(plan, candidate)
+                if buckets <= settings.TIMESERIES_MAX_BUCKETS:
+                    plan.interval, plan.estimated_buckets = candidate, buckets
+                    return plan
+
+        raise ValidationError(
+            {
+                "interval": f"Request would produce ~{plan.estimated_buckets} buckets "
+                f"(limit {settings.TIMESERIES_MAX_BUCKETS}). Use a coarser interval or a narrower window."
+            }
+        )
+
+    def _estimate_buckets(self, plan, interval):
+        if not plan.chunks:
+            return 0
+        per_series = math.ceil((plan.end - plan.start) / interval.duration)
+        return max(per_series, 1) * plan.series_count
+
+    def _coarser_than(self, interval):
+        return [i for i in COARSENING_LADDER if i.duration > interval.duration]
+
+    def _chunk_stats(self):
+        """(range_start, range_end, estimated rows) per chunk, archived ones included, oldest first, cached briefly"""
+        cache_key = self.chunk_stats_cache_key.format(shard=current_shard())
+        stats = cache.get(cache_key)
+        if stats is None:
+            with shard_connection().cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT c.range_start, c.range_end, GREATEST(cl.reltuples, 0)::bigint
+                    FROM timescaledb_information.chunks c
+                    JOIN pg_class cl ON cl.oid = format('%%I.%%I', c.chunk_schema, c.chunk_name)::regclass
+                    WHERE c.hypertable_name = %s
+                    ORDER BY c.range_start
+                    """,
+                    [TimeSeriesData._meta.db_table],
+                )
+                stats = cursor.fetchall()
+            stats = sorted([*ColdChunk.objects.values_list("range_start", "range_end", "row_count"), *stats])
+            cache.set(cache_key, stats, timeout=settings.TIMESERIES_CHUNK_STATS_TTL)
+        return stats
+
+    @classmethod
+    def invalidate_chunk_stats(cls):
+        cache.delete(cls.chunk_stats_cache_key.format(shard=current_shard()))
@@ -0,0 +1,227 @@
+from contextlib import ExitStack, nullcontext
+from contextvars import ContextVar
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+import json
+import logging
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PROFILE_KEY = "timeseries:profile:{profile_id}"
+PROFILE_HTML_KEY = "timeseries:profile:{profile_id}:html"
+PROFILE_INDEX_KEY = "timeseries:profiles"
+
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_SALT = "metrics.profiling"
+
+# tracemalloc is process-wide, so only one request at a time records allocations
+_tracemalloc_lock = threading.Lock()
+
+# Statement timings of the request being profiled; worker threads running its queries get it through a copy
+# of the request's context
+_profiled_queries = ContextVar("profiled_queries", default=None)
+
+
+def issue_token():
+    """Signed value for the X-Profile-Token header; requests carrying it are profiled until it expires"""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def time_worker_queries(connection):
+    """Time the statements a worker thread runs on `connection` for the request being profiled, if any.
+
+    Workers call it in a copy of the request's context; request threads are covered by the middleware.
+    """
+    queries = _profiled_queries.get()
+    if queries is None:
+        return nullcontext()
+    return connection.execute_wrapper(_QueryTimer(connection.alias, queries, worker=True))
+
+
+def _has_valid_token(request):
+    token = request.headers.get(TOKEN_HEADER)
+    if not token:
+        return False
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        logger.warning(f"Rejected profiling token for {request.path}")
+        return False
+    return True
+
+
+class ProfilingMiddleware:
+    """Profiles requests that carry a signed `X-Profile-Token`, or a `PROFILING_SAMPLE_RATE` share of requests
+    under `PROFILING_PATHS`.
+
+    A profiled request runs under the pyinstrument sampling profiler, with SQL timings collected on every
+    database connection, those of the workers running its time slices included, and, when no other request
+    holds it, tracemalloc. The profile is stored in Redis and its id returned in `X-Profile-Id`; staff read it
+    from /api/profiles/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("Profiling requested but pyinstrument is not installed")
+            return self.get_response(request)
+
+        queries = []
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="disabled")
+        trace_allocations = _tracemalloc_lock.acquire(blocking=False)
+        if trace_allocations and tracemalloc.is_tracing():
+            # Started outside this middleware (e.g. PYTHONTRACEMALLOC); leave it alone
+            _tracemalloc_lock.release()
+            trace_allocations = False
+        try:
+            if trace_allocations:
+                tracemalloc.start()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_QueryTimer(connection.alias, queries)))
+                stack.callback(_profiled_queries.reset, _profiled_queries.set(queries))
+                start = time.perf_counter()
+                profiler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.stop()
+                duration = time.perf_counter() - start
+            allocations = _allocation_stats() if trace_allocations else None
+        finally:
+            if trace_allocations:
+                tracemalloc.stop()
+                _tracemalloc_lock.release()
+
+        profile_id = self._store(request, response, profiler, start, duration, queries, allocations)
+        if profile_id:
+            response["X-Profile-Id"] = profile_id
+        return response
+
+    def _should_profile(self, request):
+        if _has_valid_token(request):
+            return True
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and request.path.startswith(tuple(settings.PROFILING_PATHS)) and random.random() < rate
+
+    def _store(self, request, response, profiler, start, duration, queries, allocations):
+        profile_id = uuid.uuid4().hex
+        sql_ms = sum(q["ms"] for q in queries)
+        # Worker statements overlap each other while the request thread waits on them, so they take only
+        # the wall time they cover away from the Python time
+        worker_ms = _covered_ms([q for q in queries if q["worker"]])
+        request_sql_ms = sum(q["ms"] for q in queries if not q["worker"])
+        for query in queries:
+            query["at_ms"] = round((query.pop("start") - start) * 1000, 3)
+        profile = {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.path,
+            "query": request.META.get("QUERY_STRING", ""),
+            "status": response.status_code,
+            "started_at": time.time() - duration,
+            "duration_ms": round(duration * 1000, 2),
+            "sql": {
+                "count": len(queries),
+                "total_ms": round(sql_ms, 2),
+                "worker_count": sum(q["worker"] for q in queries),
+                "worker_wall_ms": round(worker_ms, 2),
+                "slowest": sorted(queries, key=lambda q: q["ms"], reverse=True)[: settings.PROFILING_TOP_QUERIES],
+            },
+            "python_ms": round(duration * 1000 - request_sql_ms - worker_ms, 2),
+            "allocations": allocations,
+        }
+        ttl = int(settings.PROFILING_TTL.total_seconds())
+        try:
+            redis = get_redis_connection("default")
+            pipe = redis.pipeline()
+            pipe.set(PROFILE_KEY.format(profile_id=profile_id), json.dumps(profile), ex=ttl)
+            pipe.set(PROFILE_HTML_KEY.format(profile_id=profile_id), profiler.output_html(), ex=ttl)
+            pipe.zadd(PROFILE_INDEX_KEY, {profile_id: profile["started_at"]})
+            pipe.zremrangebyrank(PROFILE_INDEX_KEY, 0, -settings.PROFILING_MAX_STORED - 1)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Could not store profile of {request.path}: {e}")
+            return None
+        return profile_id
+
+
+class _QueryTimer:
+    """Database execute wrapper recording each statement's start and duration"""
+
+    def __init__(self, alias, queries, worker=False):
+        self.alias = alias
+        self.queries = queries
+        self.worker = worker
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.queries.append(
+                {"database": self.alias, "sql": sql[:2000], "ms": round(ms, 3), "start": start, "worker": self.worker}
+            )
+
+
+def _covered_ms(queries):
+    """Wall time covered by at least one of the (possibly concurrent) statements"""
+    covered, end = 0.0, None
+    for query in sorted(queries, key=lambda q: q["start"]):
+        query_end = query["start"] + query["ms"] / 1000
+        if end is None or query["start"] > end:
+            covered += query["ms"] / 1000
+            end = query_end
+        elif query_end > end:
+            covered += query_end - end
+            end = query_end
+    return covered * 1000
+
+
+def _allocation_stats():
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    top = snapshot.statistics("lineno")[: settings.PROFILING_TOP_ALLOCATIONS]
+    return {
+        "current_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "top": [
+            {"location": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+            for stat in top
+        ],
+    }
+
+
+def list_profiles(limit=50):
+    """Stored profiles, newest first; profiles whose keys expired are left out"""
+    redis = get_redis_connection("default")
+    profile_ids = redis.zrevrange(PROFILE_INDEX_KEY, 0, limit - 1)
+    if not profile_ids:
+        return []
+    profiles = redis.mget([PROFILE_KEY.format(profile_id=p.decode()) for p in profile_ids])
+    return [json.loads(profile) for profile in profiles if profile]
+
+
+def get_profile(profile_id):
+    profile = get_redis_connection("default").get(PROFILE_KEY.format(profile_id=profile_id))
+    return json.loads(profile) if profile else None
+
+
+def get_profile_html(profile_id):
+    html = get_redis_connection("default").get(PROFILE_HTML_KEY.format(profile_id=profile_id))
+    return html.decode() if html else None
@@ -0,0 +1,178 @@
+from datetime import timedelta
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from itertools import islice
+import json
+import logging
+
+from .ingest import upsert_points
+from .models import (
+    ColdChunk,
+    DayRollup,
+    DirtyRange,
+    HourRollup,
+    MinuteRollup,
+    SeriesStats,
+    Session,
+    SessionSummary,
+    TimeSeriesData,
+)
+from .sharding import lock_user, pin_user, shard_for_user, use_shard
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_MODELS = (MinuteRollup, HourRollup, DayRollup)
+
+# Summaries are stamped by the clock of the server that wrote them; the final pass looks back this much further
+CLOCK_SKEW = timedelta(minutes=1)
+
+
+class CannotMove(Exception):
+    pass
+
+
+def move_user(user_id, target, batch_size=5000):
+    """Move a user's sessions, points and aggregates to the `target` shard while ingest keeps running.
+
+    A first pass copies everything without blocking. The final pass holds the user's advisory lock on the
+    source, which makes the user's ingest wait, and copies only the sessions written since the first pass
+    began, found by their summaries' `updated_at`. Rollups are not copied again; the ranges that may have
+    been refreshed since are queued for the target's own dirty-range refresh instead. The user is then
+    repointed to `target` before the lock is released, and the source rows are deleted. Returns the number
+    of points written to the target.
+    """
+    source = shard_for_user(user_id)
+    if source == target:
+        return 0
+    _check_movable(user_id, source)
+
+    with use_shard(source), transaction.atomic(using=source):
+        # Waits out uploads already in flight, so every write the first pass can miss is stamped after `since`
+        lock_user(user_id, exclusive=True)
+        since = timezone.now() - CLOCK_SKEW
+    # Refreshing these on the source after the first pass would leave the copied rollups behind
+    pending = list(_pending_ranges(user_id, source))
+
+    copied = _copy_user(user_id, source, target, batch_size)
+    with use_shard(source), transaction.atomic(using=source):
+        lock_user(user_id, exclusive=True)
+        with transaction.atomic(using=target):
+            copied += _copy_changes(user_id, source, target, batch_size, since, pending)
+        pin_user(user_id, target, move=True)
+
+    _delete_user(user_id, source)
+    logger.info(f"Moved user {user_id} from {source} to {target} ({copied} points written)")
+    return copied
+
+
+def _check_movable(user_id, source):
+    # Archived Parquet files are laid out per shard and can't follow the user
+    archived = ColdChunk.objects.using(source).aggregate(end=Max("range_end"))["end"]
+    if archived and Session.objects.using(source).filter(user_id=user_id, start_ts__lt=archived).exists():
+        raise CannotMove(f"User {user_id} has data in {source}'s cold storage")
+
+
+def _copy_user(user_id, source, target, batch_size):
+    copied = _copy_sessions(Session.objects.using(source).filter(user_id=user_id), target, batch_size)
+    _copy_series_stats(user_id, source, target, batch_size)
+
+    fields = ["user_id", "series_id", "field", "time", "count", "sum", "min", "max"]
+    for model in ROLLUP_MODELS:
+        buckets = model.objects.using(source).filter(user_id=user_id).values(*fields).iterator(chunk_size=batch_size)
+        for batch in _batches(buckets, batch_size):
+            model.objects.using(target).bulk_create(
+                [model(**bucket) for bucket in batch],
+                update_conflicts=True,
+                unique_fields=["user_id", "series", "field", "time"],
+                update_fields=["count", "sum", "min", "max"],
+            )
+    return copied
+
+
+def _copy_changes(user_id, source, target, batch_size, since, pending):
+    """Final pass: sessions written or deleted since the first pass, series stats and pending refreshes"""
+    # Every write saves its session's summary, new sessions included
+    changed = Session.objects.using(source).filter(user_id=user_id, summary__updated_at__gte=since)
+    copied = _copy_sessions(changed, target, batch_size)
+
+    kept = Session.objects.using(source).filter(user_id=user_id).values_list("session_id", flat=True)
+    _delete_sessions(Session.objects.using(target).filter(user_id=user_id).exclude(session_id__in=list(kept)))
+
+    _copy_series_stats(user_id, source, target, batch_size)
+
+    # The target rebuilds the rollups of everything written since, or refreshed on the source since
+    written = (
+        TimeSeriesData.objects.using(source)
+        .filter(session__in=changed.values("session_id"))
+        .values("series_id")
+        .annotate(start=Min("time"), end=Max("time"))
+    )
+    ranges = [*pending, *_pending_ranges(user_id, source), *({"user_id": user_id, **r} for r in written)]
+    DirtyRange.objects.using(target).filter(user_id=user_id).delete()
+    DirtyRange.objects.using(target).bulk_create([DirtyRange(**r) for r in ranges])
+    return copied
+
+
+def _copy_sessions(sessions, target, batch_size):
+    """Copy sessions from their shard with their summaries and points; returns the points written"""
+    for batch in _batches(sessions.iterator(chunk_size=batch_size), batch_size):
+        Session.objects.using(target).bulk_create(
+            batch, update_conflicts=True, unique_fields=["session_id"], update_fields=["start_ts"]
+        )
+
+    source = sessions.db
+    session_ids = sessions.values("session_id")
+    summaries = SessionSummary.objects.using(source).filter(session_id__in=session_ids)
+    for batch in _batches(summaries.iterator(chunk_size=batch_size), batch_size):
+        SessionSummary.objects.using(target).bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["session"],
+            update_fields=["point_count", "first_time", "last_time", "series", "updated_at"],
+        )
+
+    copied = 0
+    points = TimeSeriesData.objects.using(source).filter(session_id__in=session_ids)
+    points = points.values_list("session_id", "series_id", "time", "value").iterator(chunk_size=batch_size)
+    for batch in _batches(points, batch_size):
+        rows = [(session_id, series_id, time, json.dumps(value)) for session_id, series_id, time, value in batch]
+        copied += len(upsert_points(connections[target], rows))
+    return copied
+
+
+def _copy_series_stats(user_id, source, target, batch_size):
+    stats = SeriesStats.objects.using(source).filter(user_id=user_id)
+    for batch in _batches(stats.iterator(chunk_size=batch_size), batch_size):
+        for row in batch:
+            row.id = None
+        SeriesStats.objects.using(target).bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["user_id", "series"],
+            update_fields=["point_count", "first_time", "last_time", "ranges", "updated_at"],
+        )
+
+
+def _pending_ranges(user_id, alias):
+    return DirtyRange.objects.using(alias).filter(user_id=user_id).values("user_id", "series_id", "start", "end")
+
+
+def _delete_user(user_id, source):
+    with transaction.atomic(using=source):
+        _delete_sessions(Session.objects.using(source).filter(user_id=user_id))
+        for model in (DirtyRange, SeriesStats, *ROLLUP_MODELS):
+            model.objects.using(source).filter(user_id=user_id).delete()
+
+
+def _delete_sessions(sessions):
+    session_ids = sessions.values("session_id")
+    TimeSeriesData.objects.using(sessions.db).filter(session_id__in=session_ids).delete()
+    SessionSummary.objects.using(sessions.db).filter(session_id__in=session_ids).delete()
+    sessions.delete()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import threading
+import time
+
+from .models import MetricType
+
+# Metric types by series name, shared by every request of the process
+_metric_types = {}
+_loaded_at = None
+_lock = threading.Lock()
+
+
+def load():
+    """Read every metric type into the registry; returns how many were loaded.
+
+    Called by the gunicorn master before it forks, so workers start with the registry in shared memory.
+    """
+    global _metric_types, _loaded_at
+    metric_types = {metric_type.series: metric_type for metric_type in MetricType.objects.all()}
+    with _lock:
+        _metric_types, _loaded_at = metric_types, time.monotonic()
+    return len(metric_types)
+
+
+def get(series):
+    """The MetricType named `series`, or None.
+
+    The registry is reloaded after METRIC_TYPE_REGISTRY_TTL seconds, so edits made through another process
+    show up here too. Names it doesn't hold are looked up directly, so new types are usable at once.
+    """
+    if _loaded_at is None or time.monotonic() - _loaded_at > settings.METRIC_TYPE_REGISTRY_TTL:
+        load()
+    metric_type = _metric_types.get(series)
+    if metric_type is None:
+        metric_type = MetricType.objects.filter(series=series).first()
+        if metric_type is not None:
+            _metric_types[series] = metric_type
+    return metric_type
+
+
+@receiver([post_save, post_delete], sender=MetricType)
+def expire_registry(sender, **kwargs):
+    global _loaded_at
+    _loaded_at = None
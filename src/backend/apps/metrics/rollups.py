@@ -0,0 +1,152 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import FloatField, BigIntegerField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast
+from django.dispatch import receiver
+
+from .cold_storage import archived_until
+from .intervals import Interval
+from .models import DayRollup, DirtyRange, HourRollup, MetricType, MinuteRollup, Session, TimeSeriesData
+from .sharding import current_shard, shard_connection
+from .signals import time_range_changed
+
+# Rollup pyramid, finest first; each level is built from the one below it
+PYRAMID = [
+    (Interval.parse("1m"), MinuteRollup),
+    (Interval.parse("1h"), HourRollup),
+    (Interval.parse("1d"), DayRollup),
+]
+
+# Aggregates that re-aggregate from stored buckets without loss
+ROLLUP_AGG_FUNCTIONS = ("avg", "min", "max", "count")
+
+# Large ranges (e.g. backfills) are refreshed in slices so each transaction stays small
+REFRESH_SLICE = timedelta(days=7)
+
+ROLLUP_COLUMNS = "(user_id, series_id, field, time, count, sum, min, max)"
+ON_CONFLICT = (
+    "ON CONFLICT (user_id, series_id, field, time) DO UPDATE SET "
+    "count = EXCLUDED.count, sum = EXCLUDED.sum, min = EXCLUDED.min, max = EXCLUDED.max"
+)
+
+
+def refresh_rollups(user_id, metric_type, start, end):
+    """Recompute every rollup bucket overlapping [start, end] for one (user, series), finest level first.
+
+    Called outside a transaction, as the dirty-range refresh does, each slice commits on its own. Inside one
+    (e.g. stress_test's rolled-back data) the slices are savepoints of the caller's transaction.
+    """
+    fields = metric_type.numeric_fields
+    if not fields:
+        return
+
+    # Align to the coarsest level so every level recomputes its affected buckets whole
+    coarsest = PYRAMID[-1][0]
+    slice_start = coarsest.floor(start)
+
+    # Archived ranges have no raw rows left to rebuild from; their rollups are final
+    archived = archived_until()
+    if archived:
+        slice_start = max(slice_start, coarsest.ceil(archived))
+    end = coarsest.floor(end) + coarsest.duration
+    while slice_start < end:
+        slice_end = min(slice_start + REFRESH_SLICE, end)
+        with transaction.atomic(using=current_shard()):
+            source = None
+            for resolution, model in PYRAMID:
+                _rebuild_level(model, resolution, source, user_id, metric_type.id, fields, slice_start, slice_end)
+                source = model
+        slice_start = slice_end
+
+
+def _rebuild_level(model, resolution, source, user_id, series_id, fields, start, end):
+    """Replace one level's buckets in [start, end) with aggregates of raw rows or of the level below"""
+    model.objects.filter(user_id=user_id, series_id=series_id, time__gte=start, time__lt=end).delete()
+
+    connection = shard_connection()
+    qn = connection.ops.quote_name
+    if source is None:
+        value = "(t.value ->> f.field)"
+        select = (
+            f"SELECT s.user_id, t.series_id, f.field, time_bucket(%s::interval, t.time) AS bucket, "
+            f"COUNT({value}), SUM({value}::float), MIN({value}::float), MAX({value}::float) "
+            f"FROM {qn(TimeSeriesData._meta.db_table)} t "
+            f"JOIN {qn(Session._meta.db_table)} s ON s.session_id = t.session_id "
+            f"CROSS JOIN unnest(%s::text[]) AS f(field) "
+            f"WHERE s.user_id = %s AND t.series_id = %s AND t.time >= %s AND t.time < %s "
+            f"GROUP BY s.user_id, t.series_id, f.field, bucket "
+            f"HAVING COUNT({value}) > 0"
+        )
+        params = [resolution.sql, fields, user_id, series_id, start, end]
+    else:
+        select = (
+            f"SELECT user_id, series_id, field, time_bucket(%s::interval, time) AS bucket, "
+            f"SUM(count), SUM(sum), MIN(min), MAX(max) "
+            f"FROM {qn(source._meta.db_table)} "
+            f"WHERE user_id = %s AND series_id = %s AND time >= %s AND time < %s "
+            f"GROUP BY user_id, series_id, field, bucket"
+        )
+        params = [resolution.sql, user_id, series_id, start, end]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(model._meta.db_table)} {ROLLUP_COLUMNS} {select} {ON_CONFLICT}", params)
+
+
+@receiver(time_range_changed)
+def refresh_rollups_for_range(sender, user_id, series_id, start, end, **kwargs):
+    refresh_rollups(user_id, MetricType.objects.get(pk=series_id), start, end)
+
+
+def rollup_source(user_id, metric_type, interval, agg_func_name, start, end):
+    """Coarsest rollup level that answers the query exactly, or None to read raw rows.
+
+    A level qualifies when the requested buckets are made of whole stored buckets and the window edges
+    fall on its bucket boundaries. Ranges still waiting in the dirty-range log are not rolled up yet,
+    so queries touching them read raw rows.
+    """
+    if agg_func_name not in ROLLUP_AGG_FUNCTIONS or not metric_type.numeric_fields:
+        return None
+
+    for resolution, model in reversed(PYRAMID):
+        edges_aligned = all(t is None or resolution.floor(t) == t for t in (start, end))
+        if interval.is_multiple_of(resolution) and edges_aligned:
+            break
+    else:
+        return None
+
+    pending = DirtyRange.objects.filter(user_id=user_id, series=metric_type)
+    if start:
+        pending = pending.filter(end__gte=start)
+    if end:
+        pending = pending.filter(start__lte=end)
+    if pending.exists():
+        return None
+    return model
+
+
+def rollup_query(model, user_id, metric_type, interval, agg_func_name, start, end):
+    """Re-aggregate stored buckets into `interval` buckets, one row per bucket with a column per field.
+
+    The window is half-open ([start, end)) because stored buckets can't be split at `end`.
+    """
+    queryset = model.timescale.filter(user_id=user_id, series=metric_type)
+    if start:
+        queryset = queryset.filter(time__gte=start)
+        if end:
+            queryset = queryset.filter(time__lt=end)
+
+    annotations = {"series": Value(metric_type.series)}
+    for field in metric_type.numeric_fields:
+        annotations[field] = _field_aggregate(field, agg_func_name)
+    return queryset.time_bucket("time", interval.sql).annotate(**annotations)
+
+
+def _field_aggregate(field, agg_func_name):
+    in_field = Q(field=field)
+    if agg_func_name == "avg":
+        return Sum("sum", filter=in_field) / Cast(Sum("count", filter=in_field), output_field=FloatField())
+    if agg_func_name == "min":
+        return Min("min", filter=in_field)
+    if agg_func_name == "max":
+        return Max("max", filter=in_field)
+    return Cast(Sum("count", filter=in_field), output_field=BigIntegerField())
@@ -1,7 +1,12 @@
 from rest_framework import serializers
-from .models import Session, TimeSeriesData, MetricType
+from .models import SeriesStats, Session, SessionSummary, TimeSeriesData, MetricType
+from .ingest import SessionWriter
+from .sharding import locate_session, shard_for_user, use_shard
+from . import registry
+from django.db import transaction
 from django.utils import timezone
 import jsonschema
+import uuid
 
 
 class MetricTypeSerializer(serializers.ModelSerializer):
@@ -10,6 +15,15 @@ class MetricTypeSerializer(serializers.ModelSerializer):
         fields = ["series", "schema", "description"]
 
 
+class SeriesStatsSerializer(serializers.ModelSerializer):
+    series = serializers.CharField(source="series.series")
+    schema = serializers.JSONField(source="series.schema")
+
+    class Meta:
+        model = SeriesStats
+        fields = ["series", "schema", "point_count", "first_time", "last_time", "ranges"]
+
+
 class TimeSeriesDataSerializer(serializers.ModelSerializer):
     series = serializers.CharField()
     value = serializers.JSONField()
@@ -19,26 +33,25 @@ class TimeSeriesDataSerializer(serializers.ModelSerializer):
         fields = ["series", "time", "value"]
 
     def validate_series(self, value):
-        try:
-            MetricType.objects.get(series=value)
-            return value
-        except MetricType.DoesNotExist:
+        if self._get_metric_type(value) is None:
             raise serializers.ValidationError("Invalid series name.")
+        return value
 
     def validate(self, data):
         series_name = data.get("series")
         value = data.get("value")
         if series_name and value:
+            metric_type = self._get_metric_type(series_name)
             try:
-                metric_type = MetricType.objects.get(series=series_name)
-                if metric_type.schema:
+                if metric_type and metric_type.schema:
                     jsonschema.validate(value, metric_type.schema)
-            except MetricType.DoesNotExist:
-                pass
             except jsonschema.exceptions.ValidationError as e:
                 raise serializers.ValidationError({"value": f"Value does not match schema: {str(e)}"})
         return data
 
+    def _get_metric_type(self, series_name):
+        return registry.get(series_name)
+
     def create(self, validated_data):
         series_name = validated_data.pop("series")
         metric_type = MetricType.objects.get(series=series_name)
@@ -46,6 +59,7 @@ class TimeSeriesDataSerializer(serializers.ModelSerializer):
 
 
 class SessionSerializer(serializers.ModelSerializer):
+    session_id = serializers.UUIDField(required=False)
     data = TimeSeriesDataSerializer(many=True)
 
     class Meta:
@@ -54,10 +68,35 @@ class SessionSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         data_points = validated_data.pop("data")
-        session = Session.objects.create(**validated_data)
+        return self.ingest(validated_data, data_points)
+
+    def ingest(self, validated_data, data_points):
+        """Write a session and an iterable of validated points on the user's shard, in one transaction"""
+        # The user decides the shard, so uploads without one get the session's owner or a new user first
+        if not validated_data.get("user_id"):
+            validated_data["user_id"] = self._session_owner(validated_data.get("session_id")) or uuid.uuid4()
+
+        with use_shard(shard_for_user(validated_data["user_id"])) as alias, transaction.atomic(using=alias):
+            writer = SessionWriter(**validated_data)
+            writer.write(data_points)
+            return writer.finish()
+
+    def _session_owner(self, session_id):
+        alias = locate_session(session_id) if session_id else None
+        if alias is None:
+            return None
+        return Session.objects.using(alias).values_list("user_id", flat=True).get(session_id=session_id)
 
-        for point in data_points:
-            series = point.pop("series")
-            metric_type = MetricType.objects.get(series=series)
-            TimeSeriesData.objects.create(session=session, series=metric_type, **point)
-        return session
+
+class SessionSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SessionSummary
+        fields = ["point_count", "first_time", "last_time", "series"]
+
+
+class SessionListSerializer(serializers.ModelSerializer):
+    summary = SessionSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Session
+        fields = ["user_id", "session_id", "start_ts", "summary"]
@@ -0,0 +1,232 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.exceptions import APIException, ValidationError
+import bisect
+import hashlib
+import uuid
+
+from .models import MetricType, Session, UserShard
+
+# Models whose rows belong to one user and live on that user's shard
+SHARDED_MODELS = {
+    "session",
+    "sessionsummary",
+    "seriesstats",
+    "timeseriesdata",
+    "dirtyrange",
+    "minuterollup",
+    "hourrollup",
+    "dayrollup",
+    "coldchunk",
+}
+# Models copied to every shard with the same primary keys, so sharded rows can reference them locally
+REPLICATED_MODELS = {"metrictype"}
+
+SHARD_CACHE_KEY = "timeseries:shard:{user_id}"
+
+_current_shard = ContextVar("timeseries_shard", default=None)
+
+
+class ShardMoved(APIException):
+    status_code = 503
+    default_detail = "This user's data is being moved to another shard. Retry the request."
+    default_code = "shard_moved"
+
+
+class HashRing:
+    """Consistent-hash ring over database aliases; adding a shard only remaps the users that land on it"""
+
+    def __init__(self, aliases, vnodes):
+        self._points = sorted((_hash(f"{alias}:{i}"), alias) for alias in aliases for i in range(vnodes))
+        self._keys = [point for point, _ in self._points]
+
+    def get(self, key):
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._points)
+        return self._points[index][1]
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+_ring = None
+
+
+def ring():
+    global _ring
+    if _ring is None:
+        _ring = HashRing(settings.TIMESERIES_SHARDS, settings.TIMESERIES_SHARD_VNODES)
+    return _ring
+
+
+def shard_for_user(user_id):
+    """Database alias holding a user's data: their pinned shard, or the ring's choice for new users"""
+    try:
+        user_id = uuid.UUID(str(user_id))
+    except ValueError:
+        raise ValidationError({"user_id": "Must be a valid UUID."})
+
+    key = SHARD_CACHE_KEY.format(user_id=user_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = UserShard.objects.filter(user_id=user_id).values_list("alias", flat=True).first()
+        if alias is None:
+            return ring().get(user_id)
+        cache.set(key, alias, timeout=None)
+    return alias
+
+
+def pin_user(user_id, alias, move=False):
+    """Record where a user's data lives; placement only changes through `move=True` (rebalancing)"""
+    if move:
+        UserShard.objects.update_or_create(user_id=user_id, defaults={"alias": alias})
+    elif cache.get(SHARD_CACHE_KEY.format(user_id=user_id)) is None:
+        alias = UserShard.objects.get_or_create(user_id=user_id, defaults={"alias": alias})[0].alias
+    cache.set(SHARD_CACHE_KEY.format(user_id=user_id), alias, timeout=None)
+
+
+def current_shard():
+    return _current_shard.get() or "default"
+
+
+def shard_connection():
+    return connections[current_shard()]
+
+
+@contextmanager
+def use_shard(alias):
+    """Route sharded models and raw shard queries in the enclosed block to `alias`"""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def activate_shard(alias):
+    """Switch the shard for the rest of the enclosing `use_shard` block"""
+    _current_shard.set(alias)
+
+
+def fan_out(func, *args, **kwargs):
+    """Run `func` on every shard in parallel, each call with its shard active; returns {alias: result}"""
+    aliases = settings.TIMESERIES_SHARDS
+    if len(aliases) == 1:
+        with use_shard(aliases[0]):
+            return {aliases[0]: func(*args, **kwargs)}
+
+    def run(alias):
+        try:
+            with use_shard(alias):
+                return func(*args, **kwargs)
+        finally:
+            connections.close_all()  # this worker thread's connections only
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+def locate_session(session_id):
+    """Alias of the shard holding a session, looked up on every shard; None when it doesn't exist"""
+    try:
+        session_id = uuid.UUID(str(session_id))
+    except ValueError:
+        return None
+    found = fan_out(lambda: Session.objects.filter(session_id=session_id).exists())
+    return next((alias for alias, exists in found.items() if exists), None)
+
+
+def lock_user(user_id, exclusive=False):
+    """Transaction-scoped advisory lock on a user in the current shard; ingest shares it, moves take it alone"""
+    function = "pg_advisory_xact_lock" if exclusive else "pg_advisory_xact_lock_shared"
+    with shard_connection().cursor() as cursor:
+        cursor.execute(f"SELECT {function}(%s)", [uuid.UUID(str(user_id)).int & (2**63 - 1)])
+
+
+class ShardRouter:
+    """Sends sharded models to the active shard and replicated models' writes to `default`.
+
+    Objects already loaded from a shard stay on it. Migrations create the sharded and replicated tables on
+    every shard; everything else only exists on `default`.
+    """
+
+    def _model_kind(self, model):
+        if model._meta.app_label != "metrics":
+            return None
+        if model._meta.model_name in SHARDED_MODELS:
+            return "sharded"
+        if model._meta.model_name in REPLICATED_MODELS:
+            return "replicated"
+        return None
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if self._model_kind(model) and instance is not None and instance._state.db:
+            return instance._state.db
+        if self._model_kind(model):
+            return current_shard()
+        return None
+
+    def db_for_write(self, model, **hints):
+        kind = self._model_kind(model)
+        if kind == "replicated":
+            return "default"
+        if kind == "sharded":
+            instance = hints.get("instance")
+            if instance is not None and instance._state.db:
+                return instance._state.db
+            return current_shard()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if "replicated" in (self._model_kind(type(obj1)), self._model_kind(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == "default":
+            return True
+        if db in settings.TIMESERIES_SHARDS:
+            return app_label == "metrics" and (model_name is None or model_name in SHARDED_MODELS | REPLICATED_MODELS)
+        return None
+
+
+def sync_metric_types():
+    """Copy every metric type from `default` to the other shards, keeping primary keys"""
+    metric_types = list(MetricType.objects.using("default").all())
+    for alias in settings.TIMESERIES_SHARDS:
+        if alias != "default":
+            MetricType.objects.using(alias).bulk_create(
+                metric_types,
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=["series", "schema", "description"],
+            )
+    return len(metric_types)
+
+
+@receiver(post_save, sender=MetricType)
+def replicate_metric_type(sender, instance, raw=False, using="default", **kwargs):
+    if raw or using != "default":
+        return
+    for alias in settings.TIMESERIES_SHARDS:
+        if alias != "default":
+            MetricType.objects.using(alias).update_or_create(
+                id=instance.id,
+                defaults={"series": instance.series, "schema": instance.schema, "description": instance.description},
+            )
+
+
+@receiver(post_delete, sender=MetricType)
+def delete_replicated_metric_type(sender, instance, using="default", **kwargs):
+    if using != "default":
+        return
+    for alias in settings.TIMESERIES_SHARDS:
+        if alias != "default":
+            MetricType.objects.using(alias).filter(id=instance.id).delete()
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by the dirty-range refresh job once per coalesced (user, series, time range) that ingest touched.
+# Receivers refresh whatever they derive from that slice of the hypertable.
+# Keyword arguments: user_id, series_id, start, end
+time_range_changed = Signal()
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Cast
+import contextvars
+import threading
+
+from .profiling import time_worker_queries
+from .sharding import use_shard
+from .utils import statement_timeout
+
+# Aggregates rebuilt exactly from the count, sum, min and max of each slice
+SLICEABLE_AGG_FUNCTIONS = ("avg", "min", "max", "count")
+
+PARTS = ("count", "sum", "min", "max")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Process-wide workers for slice queries; each keeps its own connection per shard (up to CONN_MAX_AGE)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.TIMESERIES_PARALLEL_CONNECTIONS, thread_name_prefix="timeseries-slice"
+            )
+    return _pool
+
+
+def slice_boundaries(chunk_starts, after=None):
+    """Interior edges of the slices a window over chunks starting at `chunk_starts` is split into.
+
+    Slices hold whole chunks, so each slice query scans its own chunks only. Chunks before `after` are
+    not read from the database and don't count. Returns [] for windows too short to be worth splitting.
+    """
+    edges = [t for t in chunk_starts[1:] if after is None or t > after]
+    chunks = len(edges) + 1
+    if settings.TIMESERIES_PARALLEL_SLICES < 2 or chunks < settings.TIMESERIES_PARALLEL_MIN_CHUNKS:
+        return []
+    slices = min(settings.TIMESERIES_PARALLEL_SLICES, chunks)
+    return [edges[round(i * chunks / slices) - 1] for i in range(1, slices)]
+
+
+def aggregate(queryset, metric_type, fields, interval, agg_func_name, boundaries, output_field):
+    """Aggregate a numeric series in time slices run concurrently, merging partial aggregates into buckets.
+
+    `fields` and `output_field` are the value fields the single-statement query aggregates for the series'
+    schema and the type it casts them to. A bucket that spans a slice edge is assembled from both sides.
+    Rows match those of the single-statement query: newest bucket first, with the series name and a column
+    per field.
+    """
+    annotations = {}
+    for field in fields:
+        value = Cast(f"value__{field}", output_field=output_field)
+        annotations.update(
+            {
+                f"{field}_count": Count(value),
+                f"{field}_sum": Sum(value),
+                f"{field}_min": Min(value),
+                f"{field}_max": Max(value),
+            }
+        )
+    alias = queryset.db
+
+    def run(context, lower, upper):
+        return context.run(run_slice, lower, upper)
+
+    def run_slice(lower, upper):
+        with use_shard(alias):
+            connections[alias].close_if_unusable_or_obsolete()
+            with time_worker_queries(connections[alias]), statement_timeout(settings.TIMESERIES_STATEMENT_TIMEOUT_MS):
+                slice_qs = queryset
+                if lower:
+                    slice_qs = slice_qs.filter(time__gte=lower)
+                if upper:
+                    slice_qs = slice_qs.filter(time__lt=upper)
+                return list(slice_qs.time_bucket("time", interval.sql).annotate(**annotations))
+
+    edges = [None, *boundaries, None]
+    # Each slice runs in its own copy of the caller's context, which carries e.g. the request's profiler
+    contexts = [contextvars.copy_context() for _ in edges[:-1]]
+    return merge(pool().map(run, contexts, edges[:-1], edges[1:]), metric_type, fields, agg_func_name)
+
+
+def merge(slice_rows, metric_type, fields, agg_func_name):
+    """Combine the per-bucket count, sum, min and max of each slice into final rows, newest bucket first"""
+    buckets = {}
+    for rows in slice_rows:
+        for row in rows:
+            merged = buckets.setdefault(row["bucket"], {})
+            for field in fields:
+                count, total, low, high = (row[f"{field}_{part}"] for part in PARTS)
+                if not count:
+                    continue
+                if field in merged:
+                    seen = merged[field]
+                    count, total, low, high = seen[0] + count, seen[1] + total, min(seen[2], low), max(seen[3], high)
+                merged[field] = (count, total, low, high)
+
+    results = []
+    for bucket in sorted(buckets, reverse=True):
+        row = {"bucket": bucket, "series": metric_type.series}
+        for field in fields:
+            row[field] = _finalize(buckets[bucket].get(field), agg_func_name)
+        results.append(row)
+    return results
+
+
+def _finalize(parts, agg_func_name):
+    if parts is None:
+        return 0 if agg_func_name == "count" else None
+    count, total, low, high = parts
+    return {"avg": total / count, "min": low, "max": high, "count": count}[agg_func_name]
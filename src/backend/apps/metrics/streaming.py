@@ -0,0 +1,181 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError, UnsupportedMediaType, ValidationError
+from rest_framework.parsers import BaseParser
+import gzip
+import hashlib
+import itertools
+import json
+import zlib
+
+from .serializers import SessionSerializer, TimeSeriesDataSerializer
+
+# Top-level fields that decide the session a streamed upload is written to
+HEADER_FIELDS = ("user_id", "session_id", "start_ts")
+SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+
+def decompress(stream, encoding):
+    """Wrap a request body stream in a reader that undoes its Content-Encoding"""
+    if encoding in ("", "identity"):
+        return stream
+    if encoding in ("gzip", "x-gzip"):
+        return _LimitedReader(gzip.GzipFile(fileobj=stream, mode="rb"))
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise UnsupportedMediaType(encoding, detail="zstd request bodies are not supported by this server.")
+        return _LimitedReader(zstandard.ZstdDecompressor().stream_reader(stream))
+    raise UnsupportedMediaType(encoding, detail=f"Unsupported Content-Encoding {encoding}. Use gzip or zstd.")
+
+
+class _LimitedReader:
+    """Caps how much a compressed body may expand to"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.remaining = settings.INGEST_MAX_DECOMPRESSED_BYTES
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size if size is not None and size >= 0 else self.remaining + 1)
+        self.remaining -= len(chunk)
+        if self.remaining < 0:
+            raise ParseError(f"Decompressed body exceeds {settings.INGEST_MAX_DECOMPRESSED_BYTES} bytes.")
+        return chunk
+
+
+class _HashingReader:
+    """Digests the (decompressed) body as the parser reads it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.sha256.update(chunk)
+        return chunk
+
+
+class StreamingSessionParser(BaseParser):
+    """JSON parser for session uploads, with gzip and zstd Content-Encoding.
+
+    Session creates get a StreamedSession that decodes points only as they are consumed, so the body is never
+    held in memory. Other requests, or servers without ijson, get the whole document parsed as usual.
+    """
+
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        stream = decompress(stream, request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower())
+        if request.method == "POST":
+            try:
+                import ijson
+            except ImportError:
+                pass
+            else:
+                body = _HashingReader(stream)
+                return StreamedSession(ijson.parse(body, use_float=True), body)
+        try:
+            return json.load(stream)
+        except (ValueError, OSError, EOFError, zlib.error) as e:
+            raise ParseError(f"JSON parse error - {e}")
+
+
+class StreamedSession:
+    """A session upload decoded incrementally from ijson parse events.
+
+    Points are written as they arrive once the session is known, i.e. when `user_id` or `session_id` comes
+    before `data` in the body. Otherwise the points are held until the body ends.
+    """
+
+    def __init__(self, events, body):
+        self.events = events
+        self.body = body
+        self.has_data = False
+        # Called with the header fields once they are known and before anything is written; may raise
+        self.header_hooks = []
+
+    @property
+    def digest(self):
+        """SHA-256 of the body read so far; of the whole body once ingest() or drain() has returned"""
+        return self.body.sha256.hexdigest()
+
+    def drain(self):
+        """Read the rest of the body without writing it, e.g. to digest a replayed upload"""
+        for _ in self.items():
+            pass
+
+    def items(self):
+        """Yield (field, value) for top-level header fields and (None, point) for each entry of `data`"""
+        import ijson
+
+        builder = None
+        try:
+            for prefix, event, value in self.events:
+                if prefix == "data.item" and builder is None:
+                    if event != "start_map":
+                        yield None, value  # not an object; left for the serializer to reject
+                        continue
+                    builder = ijson.ObjectBuilder()
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == "data.item" and event == "end_map":
+                        yield None, builder.value
+                        builder = None
+                elif prefix in HEADER_FIELDS and event in SCALAR_EVENTS:
+                    yield prefix, value
+                elif prefix == "data" and event == "start_array":
+                    self.has_data = True
+        except (ijson.JSONError, OSError, EOFError, zlib.error) as e:
+            raise ParseError(f"JSON parse error - {e}")
+
+    def ingest(self):
+        """Validate and write the upload, returning the session; invalid points roll the whole upload back"""
+        items = self.items()
+        header, held = {}, []
+        for field, value in items:
+            if field is not None:
+                header[field] = value
+            elif "user_id" in header or "session_id" in header:
+                points = itertools.chain(held, [value], _points(items))
+                break
+            else:
+                held.append(value)
+        else:
+            points = iter(held)
+
+        for hook in self.header_hooks:
+            hook(header)
+        serializer = SessionSerializer(data=header, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.ingest(dict(serializer.validated_data), self._validated(points))
+
+    def _validated(self, points):
+        batch, offset = [], 0
+        for point in points:
+            batch.append(point)
+            if len(batch) >= settings.INGEST_STREAM_BATCH_SIZE:
+                yield from _validate_batch(batch, offset)
+                offset += len(batch)
+                batch = []
+        if batch:
+            yield from _validate_batch(batch, offset)
+        if not self.has_data:
+            raise ValidationError({"data": ["This field is required."]})
+
+
+def _points(items):
+    for field, value in items:
+        if field is None:
+            yield value
+        # Header fields after the first point are too late to change the session being written
+
+
+def _validate_batch(batch, offset):
+    serializer = TimeSeriesDataSerializer(data=batch, many=True)
+    if not serializer.is_valid():
+        errors = {offset + i: error for i, error in enumerate(serializer.errors) if error}
+        raise ValidationError({"data": errors})
+    return serializer.validated_data
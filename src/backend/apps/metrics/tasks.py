@@ -1,10 +1,158 @@
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils import timezone
+
+from . import cold_storage, warmup
+from .models import DirtyRange, SeriesStats, Session, SessionSummary
+from .sharding import current_shard, fan_out, shard_connection
+from .signals import time_range_changed
 
 
 logger = get_task_logger(__name__)
 
 
+@shared_task
+def rebuild_session_summaries(session_ids=None, batch_size=500):
+    """Rebuild summaries for the given sessions, or backfill every session that has none, on every shard."""
+    rebuilt = sum(fan_out(_rebuild_session_summaries, session_ids, batch_size).values())
+    logger.info(f"Rebuilt {rebuilt} session summaries")
+    return rebuilt
+
+
+def _rebuild_session_summaries(session_ids, batch_size):
+    if session_ids:
+        sessions = Session.objects.filter(session_id__in=session_ids)
+    else:
+        sessions = Session.objects.filter(summary__isnull=True)
+
+    rebuilt = 0
+    for session in sessions.iterator(chunk_size=batch_size):
+        SessionSummary.rebuild(session)
+        rebuilt += 1
+    return rebuilt
+
+
+@shared_task
+def rebuild_series_stats(user_id=None):
+    """Rebuild the series catalog from the hypertable, for one user or everyone, on every shard."""
+    rebuilt = sum(fan_out(SeriesStats.rebuild, user_id).values())
+    logger.info(f"Rebuilt {rebuilt} series stats")
+    return rebuilt
+
+
+@shared_task
+def refresh_dirty_ranges(limit=10000):
+    """Coalesce the dirty-range log and notify receivers once per merged (user, series, range).
+
+    Each (user, series) is refreshed on its own under an advisory lock that overlapping runs skip, and its
+    rows are deleted only once every receiver returned. Receivers run outside any transaction, so a long
+    refresh commits as it goes, and a (user, series) whose refresh fails is logged and left in the log for
+    the next run without holding up the others. Shards are refreshed in parallel.
+    """
+    return sum(fan_out(_refresh_dirty_ranges, limit).values())
+
+
+def _refresh_dirty_ranges(limit):
+    rows = DirtyRange.objects.order_by("id").values_list("user_id", "series_id")[:limit]
+    keys = list(dict.fromkeys(rows))
+    if not keys:
+        return 0
+
+    refreshed = failed = 0
+    refreshed_users = set()
+    for user_id, series_id in keys:
+        try:
+            ranges = _refresh_series_ranges(user_id, series_id, limit)
+        except Exception:
+            failed += 1
+            logger.exception(f"Could not refresh dirty ranges of user {user_id}, series {series_id}")
+            continue
+        refreshed += ranges
+        if ranges:
+            refreshed_users.add(user_id)
+
+    # The refresh bumped these users' generations, which orphans responses cached before it; warming only
+    # now keeps the warmed entries valid until the user's next upload
+    for user_id in refreshed_users:
+        warmup.schedule(user_id)
+
+    summary = f"Refreshed {refreshed} coalesced ranges of {len(keys) - failed} series on {current_shard()}"
+    if failed:
+        summary += f"; {failed} failed and were left for the next run"
+    logger.info(summary)
+    return refreshed
+
+
+def _refresh_series_ranges(user_id, series_id, limit):
+    with _try_lock_series(user_id, series_id) as locked:
+        if not locked:
+            # Another run is refreshing this series
+            return 0
+        rows = list(DirtyRange.objects.filter(user_id=user_id, series_id=series_id).order_by("id")[:limit])
+        merged = _coalesce_ranges(rows, settings.DIRTY_RANGE_COALESCE_GAP)
+        for (user_id, series_id), start, end in merged:
+            time_range_changed.send(sender=DirtyRange, user_id=user_id, series_id=series_id, start=start, end=end)
+        # Rows logged while the receivers ran are newer than the ones read and stay for the next run
+        DirtyRange.objects.filter(id__in=[row.id for row in rows]).delete()
+    return len(merged)
+
+
+@contextmanager
+def _try_lock_series(user_id, series_id):
+    """Session-level advisory lock on one (user, series) in the current shard, held across transactions.
+
+    The two-key form keeps it apart from the per-user locks taken by ingest and moves.
+    """
+    with shard_connection().cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s))", [series_id, str(user_id)])
+        locked = cursor.fetchone()[0]
+    try:
+        yield locked
+    finally:
+        if locked:
+            with shard_connection().cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", [series_id, str(user_id)])
+
+
+@shared_task
+def archive_cold_chunks():
+    """Move hypertable chunks older than COLD_STORAGE_AFTER to Parquet cold storage, on every shard."""
+    archived = fan_out(cold_storage.archive_chunks, timezone.now() - settings.COLD_STORAGE_AFTER)
+    archived = sum(len(chunks) for chunks in archived.values())
+    logger.info(f"Archived {archived} chunks to cold storage")
+    return archived
+
+
+def _coalesce_ranges(rows, gap):
+    """Merge ranges of the same (user, series) that overlap or are separated by less than `gap`"""
+    by_key = {}
+    for row in rows:
+        by_key.setdefault((row.user_id, row.series_id), []).append((row.start, row.end))
+
+    merged = []
+    for key, ranges in by_key.items():
+        ranges.sort()
+        start, end = ranges[0]
+        for next_start, next_end in ranges[1:]:
+            if next_start - end <= gap:
+                end = max(end, next_end)
+            else:
+                merged.append((key, start, end))
+                start, end = next_start, next_end
+        merged.append((key, start, end))
+    return merged
+
+
+@shared_task
+def warm_user_queries(user_id):
+    """Precompute a user's most requested /api/timeseries/ responses after new uploads"""
+    warmed = warmup.warm(user_id)
+    logger.info(f"Warmed {warmed} cached responses for user {user_id}")
+    return warmed
+
+
 # @shared_task
 # def update_subway_statuses():
 #     """Update all subway line statuses."""
@@ -0,0 +1,161 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+import logging
+import math
+import uuid
+
+from .streaming import StreamedSession
+from .warmup import is_warmup
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = "timeseries:quota:{scope}:{ident}"
+SLOTS_KEY = "timeseries:quota:slots:{ident}"
+
+# Refill the bucket for the time since it was last touched, then take `cost` tokens if there are enough.
+# Returns the seconds until there will be, or 0 when the tokens were taken.
+TAKE_TOKENS = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "at")
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "at", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Leases on a user's query slots; leases older than ARGV[3] seconds belong to workers that died mid-query
+TAKE_SLOT = """
+local limit, lease, ttl = tonumber(ARGV[1]), ARGV[2], tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - ttl)
+if redis.call("ZCARD", KEYS[1]) >= limit then
+    return 0
+end
+redis.call("ZADD", KEYS[1], now, lease)
+redis.call("EXPIRE", KEYS[1], ttl)
+return 1
+"""
+
+
+def get_ident(request, user_id=None):
+    """The tenant a request is charged to: its `user_id`, or the client address when it names none"""
+    user_id = user_id or request.query_params.get("user_id")
+    if not user_id and isinstance(request.data, dict):
+        user_id = request.data.get("user_id")
+    try:
+        # Every spelling of a UUID shares one bucket
+        return f"user:{uuid.UUID(str(user_id))}"
+    except ValueError:
+        return f"addr:{BaseThrottle().get_ident(request)}"
+
+
+def take(scope, ident, cost=1):
+    """Take `cost` tokens from the scope's bucket for `ident`; returns 0, or the seconds to wait before retrying"""
+    if not settings.QUOTA_ENABLED:
+        return 0
+    rate = getattr(settings, f"QUOTA_{scope.upper()}_RATE")
+    burst = getattr(settings, f"QUOTA_{scope.upper()}_BURST")
+    try:
+        script = get_redis_connection("default").register_script(TAKE_TOKENS)
+        wait = script(keys=[BUCKET_KEY.format(scope=scope, ident=ident)], args=[rate, burst, min(cost, burst)])
+    except RedisError as e:
+        # Admission control must not take the API down with it
+        logger.warning(f"Quota check skipped for {ident}: {e}")
+        return 0
+    return float(wait)
+
+
+def charge(request, scope, cost):
+    """Charge a request `cost` more tokens once its price is known; raises Throttled (429) when over budget"""
+    if cost <= 0 or is_warmup(request):
+        return
+    wait = take(scope, get_ident(request), cost)
+    if wait:
+        raise Throttled(wait=math.ceil(wait))
+
+
+def query_cost(plan):
+    """Extra tokens an aggregation costs on top of its admission, by the buckets the planner expects it to scan"""
+    return plan.estimated_buckets // settings.QUOTA_QUERY_BUCKETS_PER_TOKEN
+
+
+@contextmanager
+def query_slot(request):
+    """Hold one of the user's `QUOTA_QUERY_CONCURRENCY` slots for an expensive query; raises Throttled when all
+    are taken"""
+    if not settings.QUOTA_ENABLED or is_warmup(request):
+        yield
+        return
+    key = SLOTS_KEY.format(ident=get_ident(request))
+    lease = uuid.uuid4().hex
+    try:
+        redis = get_redis_connection("default")
+        acquired = redis.register_script(TAKE_SLOT)(
+            keys=[key], args=[settings.QUOTA_QUERY_CONCURRENCY, lease, settings.QUOTA_SLOT_TTL]
+        )
+    except RedisError as e:
+        logger.warning(f"Concurrency quota skipped for {key}: {e}")
+        yield
+        return
+    if not acquired:
+        raise Throttled(wait=1, detail="Too many concurrent queries for this user.")
+    try:
+        yield
+    finally:
+        try:
+            redis.zrem(key, lease)
+        except RedisError as e:
+            logger.warning(f"Could not release query slot {key}: {e}")
+
+
+class QuotaThrottle(BaseThrottle):
+    """Admits a request for one token from its user's `scope` bucket"""
+
+    scope = None
+
+    def allow_request(self, request, view):
+        if is_warmup(request):
+            # Cache warmups run for the user but not at their request
+            return True
+        self.retry_after = take(self.scope, get_ident(request))
+        return not self.retry_after
+
+    def wait(self):
+        return math.ceil(self.retry_after)
+
+
+class QueryQuotaThrottle(QuotaThrottle):
+    scope = "query"
+
+
+class IngestQuotaThrottle(QuotaThrottle):
+    """Charges uploads to the user they are for; streamed bodies name it only in their first fields"""
+
+    scope = "ingest"
+
+    def allow_request(self, request, view):
+        if isinstance(request.data, StreamedSession) and not request.query_params.get("user_id"):
+            # Charged once the header is read, before anything is written
+            request.data.header_hooks.append(lambda header: self._charge_header(request, header))
+            return True
+        return super().allow_request(request, view)
+
+    def _charge_header(self, request, header):
+        wait = take(self.scope, get_ident(request, header.get("user_id")))
+        if wait:
+            raise Throttled(wait=math.ceil(wait))
@@ -0,0 +1,100 @@
+from decimal import Decimal
+from rest_framework.exceptions import ValidationError
+import re
+
+import numpy as np
+
+TRANSFORM_PATTERN = re.compile(r"^(moving_avg):(\d+)$|^(delta|rate|cumsum)$")
+
+MAX_WINDOW = 1000
+
+VALUE_FIELDS = ("value", "r", "g", "b")
+
+
+class Transform:
+    """A derived series computed from aggregated buckets: `moving_avg:<n>`, `delta`, `rate` or `cumsum`.
+
+    Transforms run per series over the buckets in time order, after aggregation, so they apply the same
+    way whichever tier answered the query. Buckets the query returned no row for count as empty, so a
+    moving average spans n buckets of time rather than n rows. Empty buckets stay empty, and buckets
+    without enough history (the first bucket of a delta or one following an empty bucket, the first
+    n - 1 of a moving average) are null.
+    """
+
+    def __init__(self, name, window=None):
+        self.name = name
+        self.window = window
+
+    @classmethod
+    def parse(cls, value):
+        match = TRANSFORM_PATTERN.match((value or "").strip().lower())
+        if not match:
+            raise ValidationError({"transform": "Invalid transform. Use moving_avg:<n>, delta, rate or cumsum."})
+        if match.group(1):
+            window = int(match.group(2))
+            if not 1 <= window <= MAX_WINDOW:
+                raise ValidationError({"transform": f"Moving average window must be between 1 and {MAX_WINDOW}."})
+            return cls("moving_avg", window)
+        return cls(match.group(3))
+
+    def apply(self, rows, interval):
+        """Replace the numeric values of aggregated rows (dicts with bucket, series and values) in place.
+
+        Rows are placed on the regular axis of `interval` buckets between each series' first and last
+        bucket. Text series are left as they are.
+        """
+        by_series = {}
+        for row in rows:
+            by_series.setdefault(row["series"], []).append(row)
+
+        for series_rows in by_series.values():
+            series_rows.sort(key=lambda row: row["bucket"])
+            numbers = [interval.bucket_number(row["bucket"]) for row in series_rows]
+            positions = np.array(numbers) - numbers[0]
+            axis = range(numbers[0], numbers[-1] + 1)
+            times = np.array([interval.bucket_start(number).timestamp() for number in axis])
+            for field in VALUE_FIELDS:
+                values = [row.get(field) for row in series_rows]
+                if field not in series_rows[0] or not all(_is_number(v) for v in values):
+                    continue
+                values = _reindex(np.array(values, dtype=float), positions, len(axis))
+                derived = getattr(self, f"_{self.name}")(values, times)
+                derived[np.isnan(values)] = np.nan
+                for row, value in zip(series_rows, derived[positions]):
+                    row[field] = None if np.isnan(value) else float(value)
+        return rows
+
+    def _moving_avg(self, values, times):
+        present = ~np.isnan(values)
+        sums = np.cumsum(np.where(present, values, 0.0))
+        counts = np.cumsum(present)
+        window_sums = sums - np.concatenate([np.zeros(self.window), sums[: -self.window]])[: len(sums)]
+        window_counts = counts - np.concatenate([np.zeros(self.window), counts[: -self.window]])[: len(counts)]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = window_sums / window_counts
+        result[: self.window - 1] = np.nan
+        return result
+
+    def _delta(self, values, times):
+        return np.concatenate([[np.nan], np.diff(values)])
+
+    def _rate(self, values, times):
+        """Change per second between consecutive buckets"""
+        return np.concatenate([[np.nan], np.diff(values) / np.diff(times)])
+
+    def _cumsum(self, values, times):
+        return np.cumsum(np.where(np.isnan(values), 0.0, values))
+
+    def __str__(self):
+        return f"{self.name}:{self.window}" if self.window else self.name
+
+
+def _reindex(values, positions, length):
+    """Spread values onto an axis of `length` buckets, with NaN for the buckets that have none"""
+    reindexed = np.full(length, np.nan)
+    reindexed[positions] = values
+    return reindexed
+
+
+def _is_number(value):
+    return value is None or (isinstance(value, (int, float, Decimal)) and not isinstance(value, bool))
@@ -1,4 +1,13 @@
-from django.db.models import Func, FloatField
+from contextlib import contextmanager
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.db.models import Aggregate, Func, FloatField
+import json
+
+from .sharding import current_shard, shard_connection
+
+# SQLSTATE of statements cancelled by Postgres, which statement_timeout raises
+QUERY_CANCELED = "57014"
 
 
 class PercentileCont(Func):
@@ -10,3 +19,57 @@ class PercentileCont(Func):
 
     def __init__(self, expression, percentile):
         super().__init__(expression, percentile=percentile)
+
+
+class First(Aggregate):
+    """TimescaleDB first(value, time): the value at the earliest time in each group, in a single pass."""
+
+    function = "first"
+
+    def __init__(self, expression, ordering="time", **extra):
+        super().__init__(expression, ordering, **extra)
+
+    def _resolve_output_field(self):
+        # The ordering column doesn't contribute to the type of the result
+        return self.get_source_expressions()[0].output_field
+
+
+class Last(First):
+    """TimescaleDB last(value, time): the value at the latest time in each group."""
+
+    function = "last"
+
+
+class Mode(Aggregate):
+    """Most frequent value in each group using the MODE ordered-set aggregate."""
+
+    function = "MODE"
+    template = "%(function)s() WITHIN GROUP (ORDER BY %(expressions)s)"
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """Run the enclosed queries in a transaction that Postgres cancels after `milliseconds`."""
+    with transaction.atomic(using=current_shard()):
+        with shard_connection().cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", [int(milliseconds)])
+        yield
+
+
+def is_query_canceled(error):
+    """True for a database error raised because Postgres cancelled the statement, e.g. on statement_timeout"""
+    return getattr(error.__cause__, "pgcode", None) == QUERY_CANCELED
+
+
+def estimated_count(queryset):
+    """Row count of a queryset as estimated by the planner from table and chunk statistics, without running it"""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -1,23 +1,68 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, Throttled, ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
-from django.db.models import F, Count, Avg, Max, Min, Value, Window, FloatField, IntegerField
-from django.db.models.functions import Cast, FirstValue
-from rest_framework.permissions import AllowAny
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from redis.exceptions import RedisError
+from django.db.models import Count, Avg, Max, Min, Q, Value, FloatField, IntegerField
+from django.utils import timezone
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample, inline_serializer
 
-from .models import MetricType, Session, TimeSeriesData
-from .serializers import MetricTypeSerializer, SessionSerializer
-from .filters import UserFilterBackend, TimeWindowFilterBackend, SeriesFilterBackend, SessionFilterBackend
+from .models import MetricType, SeriesStats, Session, TimeSeriesData
+from .serializers import MetricTypeSerializer, SeriesStatsSerializer, SessionSerializer, SessionListSerializer
+from . import cold_storage, generations, hot_tier, idempotency, profiling, slices, throttling, warmup
+from .catalog import series_with_data
+from .correlation import CORRELATION_METHODS, correlate
+from .filters import (
+    UserFilterBackend,
+    TimeWindowFilterBackend,
+    SeriesFilterBackend,
+    SessionFilterBackend,
+    parse_time_param,
+    series_filter,
+)
+from .pagination import SessionCursorPagination
+from .planner import QueryPlanner
+from .rollups import rollup_query, rollup_source
+from .sharding import activate_shard, locate_session, shard_for_user, use_shard
+from .streaming import StreamedSession, StreamingSessionParser
+from .transforms import Transform
+from .utils import First, Last, Mode, is_query_canceled, statement_timeout
 
 # from .utils import PercentileCont
 
 import logging
+import uuid
 
 
 logger = logging.getLogger(__name__)
 
 
+class ShardRoutingMixin:
+    """Runs each request on the shard of the user named by its `user_id` (query string or body)"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_shard(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user_id = request.query_params.get("user_id")
+        if not user_id and request.method == "POST" and isinstance(request.data, dict):
+            user_id = request.data.get("user_id")
+        if user_id:
+            activate_shard(shard_for_user(user_id))
+
+
 @extend_schema_view(list=extend_schema(description="List all available metric types", tags=["metrics"]))
 class MetricTypeViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = MetricType.objects.all()
@@ -25,26 +70,156 @@ class MetricTypeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
 
-@extend_schema_view(create=extend_schema(description="Create a new session with time series data", tags=["sessions"]))
-class SessionViewSet(viewsets.ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(
+        description="Series a user has data for, with point counts, time spans and numeric value ranges",
+        tags=["metrics"],
+        parameters=[
+            OpenApiParameter(
+                name="user_id", type=str, location=OpenApiParameter.QUERY, description="User ID", required=True
+            ),
+            OpenApiParameter(
+                name="series",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Series name. Supports regex and multiple values (separated by comma)",
+            ),
+        ],
+    )
+)
+class SeriesStatsViewSet(ShardRoutingMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = SeriesStatsSerializer
+    permission_classes = [AllowAny]
+    filter_backends = [UserFilterBackend, SeriesFilterBackend]
+    user_lookup = "user_id"
+
+    def get_queryset(self):
+        return SeriesStats.objects.filter(point_count__gt=0).select_related("series").order_by("series__series")
+
+
+@extend_schema_view(
+    create=extend_schema(description="Create a new session with time series data", tags=["sessions"]),
+    list=extend_schema(
+        description="List a user's sessions with their summaries, newest first (cursor paginated). Sessions "
+        "without a start time (uploaded with no start_ts and no points) cannot be placed on the cursor and are "
+        "left out; `without_start_ts` gives how many of the user's sessions that is.",
+        tags=["sessions"],
+        parameters=[
+            OpenApiParameter(
+                name="user_id", type=str, location=OpenApiParameter.QUERY, description="User ID", required=True
+            ),
+            OpenApiParameter(
+                name="start_time", type=str, location=OpenApiParameter.QUERY, description="Earliest session start"
+            ),
+            OpenApiParameter(
+                name="end_time", type=str, location=OpenApiParameter.QUERY, description="Latest session start"
+            ),
+        ],
+    ),
+)
+class SessionViewSet(ShardRoutingMixin, viewsets.ModelViewSet):
     queryset = Session.objects.all()
     serializer_class = SessionSerializer
     permission_classes = [AllowAny]
+    pagination_class = SessionCursorPagination
+    parser_classes = [StreamingSessionParser, FormParser, MultiPartParser]
+    filter_backends = [UserFilterBackend, TimeWindowFilterBackend]
+    user_lookup = "user_id"
+    time_field = "start_ts"
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Detail routes carry only the session id; find the shard that holds it
+        if self.lookup_field in kwargs and not request.query_params.get("user_id"):
+            alias = locate_session(kwargs[self.lookup_field])
+            if alias:
+                activate_shard(alias)
+
+    def get_queryset(self):
+        if self.action == "list":
+            # Sessions without a start time cannot be positioned by the cursor
+            return Session.objects.filter(start_ts__isnull=False).select_related("summary")
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return SessionListSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        without_start = self.filter_queryset(Session.objects.filter(start_ts__isnull=True))
+        response.data["without_start_ts"] = without_start.count()
+        return response
+
+    def filter_queryset(self, queryset):
+        """Listings are scoped to one user; detail routes look sessions up by primary key alone."""
+        if self.action != "list":
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def get_throttles(self):
+        # Uploads spend the ingest budget, so a burst of queries can't lock a user out of writing and vice versa
+        if self.action == "create":
+            return [throttling.IngestQuotaThrottle()]
+        return super().get_throttles()
 
     def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        if serializer.is_valid():
+        # Retries carrying the same Idempotency-Key and body replay the stored result without re-ingesting
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return self._ingest(request)
+
+        upload = {"user_id": request.query_params.get("user_id")}
+        if isinstance(request.data, StreamedSession):
+            # The user is known once the body's header fields are read, the digest once the whole body is
+            def check_replay(header):
+                upload["user_id"] = upload["user_id"] or header.get("user_id")
+                entry = idempotency.lookup(upload["user_id"], key)
+                if entry is not None:
+                    raise idempotency.Replay(entry)
+
+            request.data.header_hooks.append(check_replay)
             try:
-                serializer.save()
-                return Response({"message": "Data ingested successfully"}, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                logger.error(f"Ingest Error: {e}")
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    # def list(self, request, *args, **kwargs):
-    #     serializer = self.get_serializer(self.get_queryset(), many=True)
-    #     return Response(serializer.data)
+                response = self._ingest(request)
+            except idempotency.Replay as replay:
+                request.data.drain()
+                return idempotency.replay(replay.entry, request.data.digest)
+            body_digest = request.data.digest
+        else:
+            upload["user_id"] = upload["user_id"] or request.data.get("user_id")
+            body_digest = idempotency.digest(request.data)
+            entry = idempotency.lookup(upload["user_id"], key)
+            if entry is not None:
+                return idempotency.replay(entry, body_digest)
+            response = self._ingest(request)
+
+        if status.is_success(response.status_code):
+            idempotency.store(upload["user_id"], key, body_digest, response)
+        return response
+
+    def _ingest(self, request):
+        if isinstance(request.data, StreamedSession):
+            save = request.data.ingest
+        else:
+            serializer = self.get_serializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            save = serializer.save
+        try:
+            session = save()
+            return Response(
+                {"message": "Data ingested successfully", "session_id": str(session.session_id)},
+                status=status.HTTP_201_CREATED,
+            )
+        except APIException as e:
+            return Response(e.detail, status=e.status_code)
+        except (idempotency.Replay, Throttled):
+            # Replays are answered by create(); throttling needs DRF's Retry-After
+            raise
+        except Exception as e:
+            logger.error(f"Ingest Error: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @extend_schema_view(
@@ -66,7 +241,8 @@ class SessionViewSet(viewsets.ModelViewSet):
                 name="interval",
                 type=str,
                 location=OpenApiParameter.QUERY,
-                description="Aggregation interval (min, week, month)",
+                description="Aggregation interval as <count><unit> with unit m, h, d, w or mo (e.g. 5m, 1h, 3d, 1mo). "
+                "The names min, hour, day, week and month are also accepted",
                 default="week",
             ),
             OpenApiParameter(
@@ -79,9 +255,17 @@ class SessionViewSet(viewsets.ModelViewSet):
                 name="agg_func",
                 type=str,
                 location=OpenApiParameter.QUERY,
-                description="Aggregation function (avg, min, max, count)",
+                description="Aggregation function (avg, min, max, count, first, last, mode, count_distinct). "
+                "Text series support first, last, mode, count and count_distinct, and default to first",
                 default="avg",
             ),
+            OpenApiParameter(
+                name="transform",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Derived series computed from the aggregated buckets: moving_avg:<n> (trailing mean over n "
+                "buckets), delta, rate (change per second) or cumsum. Applies to numeric values",
+            ),
         ],
         responses={
             200: inline_serializer(
@@ -127,37 +311,101 @@ class SessionViewSet(viewsets.ModelViewSet):
         ],
     )
 )
-class TimeSeriesDataViewSet(viewsets.ReadOnlyModelViewSet):
+class TimeSeriesDataViewSet(ShardRoutingMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
-    INTERVAL_CHOICES = {"min": "1 min", "week": "1 week", "month": "1 month"}
     AGG_FUNCTIONS = {
         "avg": Avg,
         "max": Max,
         "min": Min,
         "count": Count,
+        "first": First,
+        "last": Last,
+        "mode": Mode,
+        "count_distinct": lambda field, **extra: Count(field, distinct=True, **extra),
         # "median": lambda field: PercentileCont(field, percentile=0.5),
         # "p90": lambda field: PercentileCont(field, percentile=0.9),
         # "p99": lambda field: PercentileCont(field, percentile=0.99),
     }
+    # Aggregates that are meaningful for text series; any other agg_func falls back to "first"
+    CATEGORICAL_AGG_FUNCTIONS = ("first", "last", "mode", "count", "count_distinct")
     filter_backends = [UserFilterBackend, SessionFilterBackend, SeriesFilterBackend, TimeWindowFilterBackend]
 
     def get_queryset(self):
         return TimeSeriesData.timescale.all()
 
-    def _aggregate_timeseries(self, queryset):
-        interval = self.request.query_params.get("interval", "week")
-        agg_func_name = self.request.query_params.get("agg_func", "avg")
+    def get_plan(self):
+        """Cost the request before it runs; the plan decides the interval actually used"""
+        if not hasattr(self, "_plan"):
+            params = self.request.query_params
+            stats = self._get_series_stats()
+            span = None
+            if stats:
+                span = (min(s.first_time for s in stats), max(s.last_time for s in stats))
+            self._plan = QueryPlanner().plan(
+                params.get("interval", "week"),
+                parse_time_param(params.get("start_time")),
+                parse_time_param(params.get("end_time")),
+                len(stats),
+                span,
+            )
+        return self._plan
+
+    def _get_metric_types(self):
+        """Metric types matching the `series` parameter"""
+        series = self.request.query_params.get("series")
+        metric_types = MetricType.objects.all()
+        if series:
+            metric_types = metric_types.filter(series_filter(series, field="series"))
+        return metric_types
+
+    def _get_series_stats(self):
+        """Catalog entries of the requested series that hold data in the window; empty series are skipped"""
+        if not hasattr(self, "_series_stats"):
+            params = self.request.query_params
+            if not params.get("user_id"):
+                raise ValidationError("user_id is required")
+            start = parse_time_param(params.get("start_time"))
+            end = (parse_time_param(params.get("end_time")) or timezone.now()) if start else None
+            self._series_stats = list(series_with_data(params["user_id"], self._get_metric_types(), start, end))
+        return self._series_stats
+
+    def _aggregate_timeseries(self, queryset, interval):
+        agg_func_name = self.request.query_params.get("agg_func", "avg").lower()
 
         try:
-            agg_func = self.AGG_FUNCTIONS[agg_func_name.lower()]
+            agg_func = self.AGG_FUNCTIONS[agg_func_name]
         except KeyError:
             return TimeSeriesData.timescale.none()
 
-        series_types = queryset.values_list("series__series", "series__schema").distinct()
+        cold_split = self._get_cold_split(interval)
         results = []
 
-        for series_name, schema in series_types:
+        for stats in self._get_series_stats():
+            metric_type = stats.series
+            series_name, schema = metric_type.series, metric_type.schema
+            if self._is_numeric_schema(schema) or self._is_rgb_schema(schema):
+                rollup_data = self._get_rollup_data(metric_type, interval, agg_func_name)
+                if rollup_data is not None:
+                    results.extend(rollup_data)
+                    continue
+
             series_qs = queryset.filter(series__series=series_name)
+            cold_data = []
+            if cold_split:
+                cold_data = self._get_cold_data(series_qs, metric_type, interval, agg_func_name, cold_split)
+                series_qs = series_qs.filter(time__gte=cold_split)
+
+            boundaries = self._get_slice_boundaries(metric_type, agg_func_name, cold_split)
+            if boundaries:
+                # Same fields and casts as the single-statement annotations below
+                fields, _ = self._get_series_fields(metric_type, agg_func_name)
+                output_field = IntegerField() if self._is_rgb_schema(schema) else FloatField()
+                results.extend(
+                    slices.aggregate(series_qs, metric_type, fields, interval, agg_func_name, boundaries, output_field)
+                )
+                results.extend(cold_data)
+                continue
+
             time_bucket_query = self._get_time_bucket_query(series_qs, interval)
 
             if self._is_numeric_schema(schema):
@@ -167,14 +415,11 @@ class TimeSeriesDataViewSet(viewsets.ReadOnlyModelViewSet):
                 annotations = self._get_rgb_annotations(series_name, agg_func)
                 series_data = time_bucket_query.annotate(**annotations)
             else:
-                time_bucket_query = time_bucket_query.values("bucket")
-                annotations = self._get_default_annotations(series_name)
+                annotations = self._get_default_annotations(series_name, agg_func_name)
                 series_data = time_bucket_query.annotate(**annotations)
-                series_data = series_data.distinct(
-                    "bucket"
-                )  # NOTE: The entries aren't bucketed as expected. Further investigation needed.
 
             results.extend(series_data)
+            results.extend(cold_data)
 
         return results
 
@@ -188,9 +433,72 @@ class TimeSeriesDataViewSet(viewsets.ReadOnlyModelViewSet):
         properties = schema.get("properties", {})
         return "value" in properties and properties["value"].get("type") == "number"
 
+    def _get_rollup_data(self, metric_type, interval, agg_func_name):
+        """Answer from the rollup pyramid when a stored resolution covers the request, else None"""
+        params = self.request.query_params
+        if params.get("session_id"):
+            return None  # rollups are per user, not per session
+
+        start = parse_time_param(params.get("start_time"))
+        end = parse_time_param(params.get("end_time")) if start else None
+        model = rollup_source(params["user_id"], metric_type, interval, agg_func_name, start, end)
+        if model is None:
+            return None
+        return rollup_query(model, params["user_id"], metric_type, interval, agg_func_name, start, end)
+
+    def _get_cold_split(self, interval):
+        """First bucket boundary after the archived range when the window reaches into it, else None"""
+        archived = cold_storage.archived_until()
+        start = parse_time_param(self.request.query_params.get("start_time"))
+        if archived is None or (start and start >= archived):
+            return None
+        return interval.ceil(archived)
+
+    def _get_cold_data(self, series_qs, metric_type, interval, agg_func_name, split):
+        """Aggregate the window up to `split` from Parquet cold storage, newest bucket first"""
+        params = self.request.query_params
+        start = parse_time_param(params.get("start_time"))
+        end = parse_time_param(params.get("end_time")) if start else None
+        sessions = Session.objects.filter(user_id=params["user_id"])
+        if params.get("session_id"):
+            sessions = sessions.filter(session_id=params["session_id"])
+
+        # Rows after the archive end that share its last bucket are aggregated together with the archive
+        recent_rows = list(series_qs.filter(time__lt=split).values_list("time", "value"))
+        fields, series_agg = self._get_series_fields(metric_type, agg_func_name)
+        return cold_storage.aggregate(
+            params["user_id"],
+            sessions.values_list("session_id", flat=True),
+            metric_type,
+            interval,
+            series_agg,
+            start,
+            end,
+            split,
+            recent_rows,
+            fields,
+        )
+
+    def _get_slice_boundaries(self, metric_type, agg_func_name, after):
+        """Edges of the time slices a long raw-row query runs in concurrently, or [] to run one statement"""
+        if not self._can_slice or agg_func_name not in slices.SLICEABLE_AGG_FUNCTIONS:
+            return []
+        # Only series the single statement aggregates as numbers; others keep their text aggregates
+        if not (self._is_numeric_schema(metric_type.schema) or self._is_rgb_schema(metric_type.schema)):
+            return []
+        return slices.slice_boundaries(self.get_plan().chunk_starts, after)
+
+    def _get_series_fields(self, metric_type, agg_func_name):
+        """Value fields aggregated outside the database for a series, and the aggregate applied to them"""
+        if self._is_numeric_schema(metric_type.schema):
+            return ["value"], agg_func_name
+        if self._is_rgb_schema(metric_type.schema):
+            return ["r", "g", "b"], agg_func_name
+        return None, agg_func_name if agg_func_name in self.CATEGORICAL_AGG_FUNCTIONS else "first"
+
     def _get_time_bucket_query(self, series_qs, interval):
         """Create base time bucket query"""
-        return series_qs.time_bucket(field="time", interval=self.INTERVAL_CHOICES[interval])
+        return series_qs.time_bucket(field="time", interval=interval.sql)
 
     def _get_numeric_annotations(self, series_name, agg_func):
         """Get annotations for numeric type"""
@@ -208,13 +516,21 @@ class TimeSeriesDataViewSet(viewsets.ReadOnlyModelViewSet):
             "b": agg_func(Cast("value__b", output_field=IntegerField())),
         }
 
-    def _get_default_annotations(self, series_name):
+    def _get_default_annotations(self, series_name, agg_func_name):
         """Get annotations for string type"""
+        if agg_func_name not in self.CATEGORICAL_AGG_FUNCTIONS:
+            agg_func_name = "first"
         return {
             "series": Value(series_name),
-            "value": Window(expression=FirstValue("value__value"), partition_by=["bucket"], order_by=F("time").asc()),
+            "value": self.AGG_FUNCTIONS[agg_func_name](KeyTextTransform("value", "value")),
         }
 
+    def _round(self, value, ndigits=None):
+        """Round numbers, leaving text values and empty aggregates untouched"""
+        if isinstance(value, (int, float)):
+            return round(value, ndigits)
+        return value
+
     def _format_response_data(self, aggregated_data):
         """Format response data with clean numbers"""
         formatted_data = []
@@ -227,26 +543,319 @@ class TimeSeriesDataViewSet(viewsets.ReadOnlyModelViewSet):
 
             # Handle RGB values
             if all(k in item for k in ["r", "g", "b"]):
-                formatted_item["value"] = {"r": round(item["r"]), "g": round(item["g"]), "b": round(item["b"])}
-            # Handle numeric values
+                formatted_item["value"] = {k: self._round(item[k]) for k in ["r", "g", "b"]}
+            # Handle numeric and text values
             elif "value" in item:
-                formatted_item["value"] = round(item["value"], 2)
+                formatted_item["value"] = self._round(item["value"], 2)
 
             formatted_data.append(formatted_item)
 
         return formatted_data
 
+    def _get_hot_tier_data(self, interval):
+        """Answer windows that fall entirely inside the Redis hot horizon, else None"""
+        params = self.request.query_params
+        agg_func_name = params.get("agg_func", "avg").lower()
+        if interval.is_calendar or agg_func_name not in self.AGG_FUNCTIONS:
+            return None
+
+        start = parse_time_param(params.get("start_time"))
+        end = parse_time_param(params.get("end_time"))
+        metric_types = [stats.series for stats in self._get_series_stats()]
+        if not hot_tier.covers(params["user_id"], [mt.series for mt in metric_types], start, end):
+            return None
+
+        results = []
+        try:
+            for metric_type in metric_types:
+                points = hot_tier.get_points(
+                    params["user_id"], metric_type.series, start, end, session_id=params.get("session_id")
+                )
+                fields, series_agg = self._get_series_fields(metric_type, agg_func_name)
+                results.extend(hot_tier.aggregate_points(points, metric_type.series, interval, series_agg, fields))
+        except RedisError as e:
+            logger.warning(f"Hot tier read failed, falling back to the database: {e}")
+            return None
+        return results
+
+    def _get_validators(self, params):
+        """(ETag, Last-Modified) of the result from the user's data generation, or None without Redis"""
+        user_id = params.get("user_id")
+        if user_id:
+            # Checked here as shard_for_user would, since validators are computed before the filters run
+            try:
+                uuid.UUID(str(user_id))
+            except ValueError:
+                raise ValidationError({"user_id": "Must be a valid UUID."})
+        generation = generations.get_generation(user_id) if user_id else None
+        if generation is None:
+            return None
+        return generations.etag(user_id, generation[0], params), int(generation[1].timestamp())
+
+    def _get_not_modified(self, validators):
+        # Unchanged polls are answered from the user's data generation alone, before any SQL
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        not_modified = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+        return not_modified
+
+    def _get_validator_headers(self, validators):
+        if validators is None:
+            return {}
+        etag, last_modified = validators
+        return {"ETag": etag, "Last-Modified": http_date(last_modified), "Cache-Control": "private, no-cache"}
+
+    def _timeout_response(self, error):
+        logger.warning(f"Timeseries query cancelled: {error}")
+        return Response(
+            {"error": "Query exceeded the time limit. Narrow the window or use a coarser interval."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        aggregated_data = self._aggregate_timeseries(queryset)
+        validators = self._get_validators(request.query_params)
+        if validators and not warmup.is_warmup(request):
+            warmup.record_query(request.query_params["user_id"], request.query_params)
+        not_modified = self._get_not_modified(validators)
+        if not_modified is not None:
+            return not_modified
+        cached = None
+        if validators:
+            cached = warmup.get_response(request.query_params["user_id"], validators[0], request)
+        if cached is not None:
+            return Response(cached, headers=self._get_validator_headers(validators))
+
+        transform = request.query_params.get("transform")
+        transform = Transform.parse(transform) if transform else None
+        plan = self.get_plan()
+        throttling.charge(request, "query", throttling.query_cost(plan))
+        aggregated_data = self._get_hot_tier_data(plan.interval)
+        if aggregated_data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            # Slices run on other connections, which can't see writes of a transaction still open here
+            self._can_slice = not connections[queryset.db].in_atomic_block
+            try:
+                with throttling.query_slot(request), statement_timeout(settings.TIMESERIES_STATEMENT_TIMEOUT_MS):
+                    aggregated_data = self._aggregate_timeseries(queryset, plan.interval)
+            except OperationalError as e:
+                if not is_query_canceled(e):
+                    raise
+                return self._timeout_response(e)
+
+        if transform:
+            aggregated_data = transform.apply(list(aggregated_data), plan.interval)
 
         response = {
             "metadata": {
                 "count": len(aggregated_data),
-                "interval": request.query_params.get("interval", "week"),
+                "interval": str(plan.interval),
                 "agg_func": request.query_params.get("agg_func", "avg"),
+                "transform": str(transform) if transform else None,
+                "plan": plan.as_metadata(),
             },
             "results": self._format_response_data(aggregated_data),
         }
+        if validators:
+            warmup.store_response(request.query_params["user_id"], validators[0], response, request)
+        return Response(response, headers=self._get_validator_headers(validators))
+
+    @extend_schema(
+        description="Several series aggregated onto one shared bucket axis as a wide table, newest bucket first, "
+        "with an optional correlation summary over the window",
+        tags=["timeseries"],
+        parameters=[
+            OpenApiParameter(
+                name="user_id", type=str, location=OpenApiParameter.QUERY, description="User ID", required=True
+            ),
+            OpenApiParameter(
+                name="series",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Series to align. Supports regex and multiple values (separated by comma)",
+                required=True,
+            ),
+            OpenApiParameter(name="session_id", type=str, location=OpenApiParameter.QUERY, description="Session ID"),
+            OpenApiParameter(
+                name="interval", type=str, location=OpenApiParameter.QUERY, description="Bucket width", default="week"
+            ),
+            OpenApiParameter(name="start_time", type=str, location=OpenApiParameter.QUERY, description="Start time"),
+            OpenApiParameter(name="end_time", type=str, location=OpenApiParameter.QUERY, description="End time"),
+            OpenApiParameter(
+                name="agg_func",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Aggregation function, as for /api/timeseries/",
+                default="avg",
+            ),
+            OpenApiParameter(
+                name="correlation",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="pearson or spearman: pairwise coefficients between the numeric columns, each "
+                "computed over the buckets where both have a value",
+            ),
+            OpenApiParameter(
+                name="summary_only",
+                type=bool,
+                location=OpenApiParameter.QUERY,
+                description="Return the metadata and correlation without the rows",
+            ),
+        ],
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "metadata": {
+                        "count": 1,
+                        "interval": "1w",
+                        "agg_func": "avg",
+                        "columns": ["bucket", "session.gut_health_score", "session.urine.night_count"],
+                        "correlation": {
+                            "method": "pearson",
+                            "pairs": [
+                                {
+                                    "a": "session.gut_health_score",
+                                    "b": "session.urine.night_count",
+                                    "coefficient": -0.42,
+                                    "buckets": 52,
+                                }
+                            ],
+                        },
+                    },
+                    "results": [
+                        {
+                            "bucket": "2024-01-01T00:00:00Z",
+                            "session.gut_health_score": 71.5,
+                            "session.urine.night_count": 1.0,
+                        }
+                    ],
+                },
+                response_only=True,
+            )
+        ],
+    )
+    @action(detail=False, methods=["get"])
+    def aligned(self, request):
+        params = request.query_params
+        if not params.get("series"):
+            raise ValidationError({"series": "Name the series to align."})
+        agg_func_name = params.get("agg_func", "avg").lower()
+        if agg_func_name not in self.AGG_FUNCTIONS:
+            raise ValidationError({"agg_func": f"Unknown aggregation function {agg_func_name}."})
+        method = params.get("correlation", "").lower() or None
+        if method and method not in CORRELATION_METHODS:
+            raise ValidationError({"correlation": f"Use one of {', '.join(CORRELATION_METHODS)}."})
+        metric_types = list(self._get_metric_types())
+        if len(metric_types) > settings.TIMESERIES_MAX_ALIGNED_SERIES:
+            raise ValidationError(
+                {"series": f"Matches {len(metric_types)} series (limit {settings.TIMESERIES_MAX_ALIGNED_SERIES})."}
+            )
+
+        # The wide layout gets validators of its own so they never match a /api/timeseries/ response
+        validators = self._get_validators({**params.dict(), "layout": "aligned"})
+        not_modified = self._get_not_modified(validators)
+        if not_modified is not None:
+            return not_modified
+
+        plan = self.get_plan()
+        throttling.charge(request, "query", throttling.query_cost(plan))
+        queryset = self.filter_queryset(self.get_queryset())
+        start = parse_time_param(params.get("start_time"))
+        cold_split = self._get_cold_split(plan.interval)
+        if cold_split:
+            # Archived rows are only in Parquet; the table starts at the first bucket held whole in the database
+            queryset = queryset.filter(time__gte=cold_split)
+            start = cold_split
+
+        columns, annotations = self._get_aligned_annotations(metric_types, agg_func_name)
+        rows = []
+        if annotations:
+            try:
+                with throttling.query_slot(request), statement_timeout(settings.TIMESERIES_STATEMENT_TIMEOUT_MS):
+                    rows = list(self._get_time_bucket_query(queryset, plan.interval).annotate(**annotations))
+            except OperationalError as e:
+                if not is_query_canceled(e):
+                    raise
+                return self._timeout_response(e)
+
+        metadata = {
+            "count": len(rows),
+            "interval": str(plan.interval),
+            "agg_func": agg_func_name,
+            "start": start,
+            "columns": ["bucket", *(name for _, name, _ in columns)],
+            "plan": plan.as_metadata(),
+        }
+        if method:
+            numeric = {name: [row[alias] for row in rows] for alias, name, is_numeric in columns if is_numeric}
+            metadata["correlation"] = {"method": method, "pairs": correlate(numeric, method)}
 
-        return Response(response)
+        results = []
+        if params.get("summary_only", "").lower() not in ("1", "true"):
+            results = [
+                {"bucket": row["bucket"], **{name: self._round(row[alias], 2) for alias, name, _ in columns}}
+                for row in rows
+            ]
+        return Response({"metadata": metadata, "results": results}, headers=self._get_validator_headers(validators))
+
+    def _get_aligned_annotations(self, metric_types, agg_func_name):
+        """One filtered aggregate per series and value field, so a single GROUP BY fills every column.
+
+        Returns the columns as (alias, name, numeric) and the annotations. RGB series are flattened to
+        `<series>.r`, `<series>.g` and `<series>.b`.
+        """
+        columns, annotations = [], {}
+        for metric_type in metric_types:
+            fields, series_agg = self._get_series_fields(metric_type, agg_func_name)
+            if fields is None:
+                expressions = {metric_type.series: KeyTextTransform("value", "value")}
+            elif fields == ["value"]:
+                expressions = {metric_type.series: Cast("value__value", output_field=FloatField())}
+            else:
+                expressions = {
+                    f"{metric_type.series}.{field}": Cast(f"value__{field}", output_field=IntegerField())
+                    for field in fields
+                }
+            is_numeric = fields is not None or series_agg in ("count", "count_distinct")
+            for name, expression in expressions.items():
+                alias = f"column_{len(columns)}"
+                annotations[alias] = self.AGG_FUNCTIONS[series_agg](expression, filter=Q(series_id=metric_type.id))
+                columns.append((alias, name, is_numeric))
+        return columns, annotations
+
+
+@extend_schema_view(
+    list=extend_schema(description="Recently captured request profiles, newest first (staff only)", tags=["profiling"]),
+    retrieve=extend_schema(description="Timings, SQL and allocations of one profile (staff only)", tags=["profiling"]),
+)
+class ProfileViewSet(viewsets.ViewSet):
+    """Profiles captured by ProfilingMiddleware"""
+
+    permission_classes = [IsAdminUser]
+    lookup_value_regex = "[0-9a-f]{32}"
+
+    def list(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 50)), settings.PROFILING_MAX_STORED)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        profiles = profiling.list_profiles(limit)
+        # The listing stays small; the slowest queries and allocations are in the detail view
+        return Response([{k: v for k, v in p.items() if k not in ("sql", "allocations")} for p in profiles])
+
+    def retrieve(self, request, pk=None):
+        profile = profiling.get_profile(pk)
+        if profile is None:
+            raise Http404
+        return Response(profile)
+
+    @extend_schema(description="Interactive pyinstrument call tree of one profile, as HTML (staff only)")
+    @action(detail=True, methods=["get"])
+    def flamegraph(self, request, pk=None):
+        html = profiling.get_profile_html(pk)
+        if html is None:
+            raise Http404
+        return HttpResponse(html, content_type="text/html")
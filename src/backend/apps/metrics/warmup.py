@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+import logging
+import time
+import uuid
+
+from .generations import normalized_query
+
+logger = logging.getLogger(__name__)
+
+# Per-user sorted set of normalized /api/timeseries/ query strings, scored by how often they were requested
+QUERY_LOG_KEY = "timeseries:queries:{user_id}"
+# Set while a warmup is scheduled for the user; refreshes finding it set don't schedule another
+PENDING_KEY = "timeseries:warmup:pending:{user_id}"
+STATS_KEY = "timeseries:warmup:stats"
+# Computed responses by ETag; the ETag carries the user's data generation, so entries never go stale
+RESPONSE_KEY = "timeseries:response:{etag}"
+# Per-user sorted set of the ETags with a stored response, scored by last use, to evict the least recently used
+RESPONSES_KEY = "timeseries:responses:{user_id}"
+
+
+def record_query(user_id, params):
+    """Count one request of a query shape in the user's frequency log"""
+    key = QUERY_LOG_KEY.format(user_id=_user(user_id))
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        pipe.zincrby(key, 1, normalized_query(params))
+        # Keep the most requested shapes only
+        pipe.zremrangebyrank(key, 0, -settings.WARMUP_QUERY_LOG_SIZE - 1)
+        pipe.expire(key, int(settings.WARMUP_QUERY_LOG_TTL.total_seconds()))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not record query of user {user_id}: {e}")
+
+
+def get_response(user_id, etag, request):
+    """The stored response for an ETag, or None; counts hits, misses and hits on warmed entries"""
+    entry = cache.get(RESPONSE_KEY.format(etag=etag))
+    if not is_warmup(request):
+        _count("hits" if entry else "misses")
+        if entry and entry["warmed"]:
+            _count("warm_hits")
+    if entry:
+        key = RESPONSES_KEY.format(user_id=_user(user_id))
+        try:
+            get_redis_connection("default").zadd(key, {etag: time.time()}, xx=True)
+        except RedisError as e:
+            logger.warning(f"Could not mark response of user {user_id} as used: {e}")
+    return entry["data"] if entry else None
+
+
+def store_response(user_id, etag, data, request):
+    """Store a response, evicting the user's least recently used ones beyond TIMESERIES_RESPONSE_CACHE_SIZE"""
+    key = RESPONSES_KEY.format(user_id=_user(user_id))
+    ttl = int(settings.TIMESERIES_RESPONSE_CACHE_TTL.total_seconds())
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        pipe.zadd(key, {etag: time.time()})
+        pipe.zrange(key, 0, -settings.TIMESERIES_RESPONSE_CACHE_SIZE - 1)
+        pipe.zremrangebyrank(key, 0, -settings.TIMESERIES_RESPONSE_CACHE_SIZE - 1)
+        pipe.expire(key, ttl)
+        evicted = pipe.execute()[1]
+    except RedisError as e:
+        # An entry that isn't counted against the user could never be evicted
+        logger.warning(f"Could not store response of user {user_id}: {e}")
+        return
+    cache.set(RESPONSE_KEY.format(etag=etag), {"data": data, "warmed": is_warmup(request)}, timeout=ttl)
+    if evicted:
+        cache.delete_many([RESPONSE_KEY.format(etag=etag.decode()) for etag in evicted])
+
+
+def is_warmup(request):
+    return getattr(request, "cache_warmup", False)
+
+
+def schedule(user_id):
+    """Queue a warmup of the user's common queries, unless one is already waiting.
+
+    Scheduled by the dirty-range refresh once the user's new data is rolled up and their generation bumped,
+    so the warmed responses stay valid until the next upload. The task runs WARMUP_DEBOUNCE seconds after
+    the first refresh of a burst, so it sees the whole burst.
+    """
+    if not settings.WARMUP_ENABLED:
+        return
+    from settings import celery_app  # noqa: F401 (loaded on first use; configures the broker before sending)
+    from .tasks import warm_user_queries
+
+    try:
+        redis = get_redis_connection("default")
+        if not redis.set(PENDING_KEY.format(user_id=_user(user_id)), 1, nx=True, ex=settings.WARMUP_DEBOUNCE * 2):
+            return
+        warm_user_queries.apply_async(args=[str(user_id)], countdown=settings.WARMUP_DEBOUNCE)
+    except Exception as e:
+        # A missed warmup only costs the next dashboard load a cache miss
+        logger.warning(f"Could not schedule cache warmup for user {user_id}: {e}")
+
+
+def warm(user_id):
+    """Recompute and store responses for the user's most requested query shapes; returns how many were stored"""
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from .views import TimeSeriesDataViewSet
+
+    redis = get_redis_connection("default")
+    redis.delete(PENDING_KEY.format(user_id=_user(user_id)))
+    queries = redis.zrevrange(QUERY_LOG_KEY.format(user_id=_user(user_id)), 0, settings.WARMUP_MAX_QUERIES - 1)
+
+    view = TimeSeriesDataViewSet.as_view({"get": "list"})
+    factory = RequestFactory()
+    warmed = 0
+    for query in queries:
+        request = factory.get(f"/api/timeseries/?{query.decode()}")
+        request.user = AnonymousUser()
+        request.cache_warmup = True
+        response = view(request)
+        if response.status_code == 200:
+            warmed += 1
+        else:
+            logger.info(f"Warmup of {query.decode()} for user {user_id} returned {response.status_code}")
+    _count("warmed", warmed)
+    return warmed
+
+
+def get_stats():
+    """Response cache counters since they were last reset, with the share of lookups served by warmed entries"""
+    stats = {k.decode(): int(v) for k, v in get_redis_connection("default").hgetall(STATS_KEY).items()}
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_ratio"] = stats.get("hits", 0) / lookups if lookups else None
+    stats["warm_hit_ratio"] = stats.get("warm_hits", 0) / lookups if lookups else None
+    return stats
+
+
+def reset_stats():
+    get_redis_connection("default").delete(STATS_KEY)
+
+
+def _count(field, amount=1):
+    try:
+        get_redis_connection("default").hincrby(STATS_KEY, field, amount)
+    except RedisError as e:
+        logger.warning(f"Could not count response cache {field}: {e}")
+
+
+def _user(user_id):
+    # Query strings may spell the UUID differently from the stored one
+    return uuid.UUID(str(user_id))
@@ -0,0 +1,39 @@
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", ":8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+# Development reloads code in each worker, which rules out loading it once in the master
+reload = os.getenv("GUNICORN_RELOAD", "false").lower() == "true"
+
+# The master imports the application once and workers share its memory copy-on-write
+preload_app = not reload
+
+if preload_app:
+    # Collections in the master would write to every object's header and unshare the pages; workers turn
+    # the collector back on after the fork
+    gc.disable()
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from django.db import DatabaseError, connections
+    from metrics import registry
+
+    try:
+        server.log.info(f"Preloaded {registry.load()} metric types")
+    except DatabaseError as e:
+        # Workers fill the registry on first use instead
+        server.log.warning(f"Could not preload metric types: {e}")
+    # Connections opened here would be shared by every worker; each opens its own instead
+    connections.close_all()
+    # Move everything loaded so far out of the collector's reach, so workers never touch those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
@@ -1,3 +1,11 @@
-from .celery import app as celery_app
+def __getattr__(name):
+    # Celery is imported on first use, not by every process that loads the settings package (web workers,
+    # management commands). `celery -A settings` still finds the app in settings.celery.
+    if name == "celery_app":
+        from .celery import app
+
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ("celery_app",)
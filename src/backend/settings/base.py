@@ -1,5 +1,6 @@
 import os
 import sys
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project
@@ -7,7 +8,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.path.join(BASE_DIR, "apps"))
 
 # Debug settings
-DEBUG = os.environ.get("DEBUG", "False")
+DEBUG = os.environ.get("DEBUG", "False") == "True"
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-default-secret-key-here")
 
 # Application definition
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "metrics.profiling.ProfilingMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,6 +81,17 @@ DATABASES = {
     }
 }
 
+# Time series shards: "default" plus extra TimescaleDB nodes given as DB_SHARDS="shard_1=host[:port],..."
+# Each user's sessions and points live on one shard; see metrics.sharding
+TIMESERIES_SHARDS = ["default"]
+for shard in filter(None, os.environ.get("DB_SHARDS", "").split(",")):
+    alias, _, address = shard.strip().partition("=")
+    host, _, port = address.partition(":")
+    DATABASES[alias] = {**DATABASES["default"], "HOST": host, "PORT": int(port or 5432)}
+    TIMESERIES_SHARDS.append(alias)
+TIMESERIES_SHARD_VNODES = 128
+DATABASE_ROUTERS = ["metrics.sharding.ShardRouter"]
+
 # Redis and Channels
 REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379")
 
@@ -102,6 +115,64 @@ CACHES = {
     }
 }
 
+# How long a successful ingest result is replayed for retries carrying the same Idempotency-Key
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# Streamed session uploads (gzip/zstd bodies are decoded and written as they arrive)
+INGEST_STREAM_BATCH_SIZE = 1000  # points validated per batch before being handed to the writer
+INGEST_MAX_DECOMPRESSED_BYTES = int(os.getenv("INGEST_MAX_DECOMPRESSED_BYTES", 1024 * 1024 * 1024))
+
+# Seconds a process trusts its in-memory MetricType registry before re-reading the table
+METRIC_TYPE_REGISTRY_TTL = 300
+
+# Query guardrails for /api/timeseries/
+TIMESERIES_MAX_BUCKETS = 20000
+TIMESERIES_MAX_CHUNKS = 260  # ~5 years of 1-week chunks
+TIMESERIES_AUTO_COARSEN = True  # coarsen the interval instead of rejecting requests over the bucket limit
+TIMESERIES_STATEMENT_TIMEOUT_MS = 15000
+TIMESERIES_CHUNK_STATS_TTL = 300
+TIMESERIES_MAX_ALIGNED_SERIES = 20  # columns of one /api/timeseries/aligned/ table
+
+# Long raw-row aggregations are split into chunk-aligned time slices queried concurrently
+TIMESERIES_PARALLEL_SLICES = int(os.getenv("TIMESERIES_PARALLEL_SLICES", 4))  # per series; below 2 disables it
+TIMESERIES_PARALLEL_MIN_CHUNKS = 8  # windows over fewer chunks run as one statement
+TIMESERIES_PARALLEL_CONNECTIONS = int(os.getenv("TIMESERIES_PARALLEL_CONNECTIONS", 8))  # slice queries per process
+
+# Per-user admission control (metrics.throttling): token buckets in Redis refilled at RATE tokens/s up to BURST.
+# Requests over budget get 429 with Retry-After.
+QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "true").lower() == "true"
+QUOTA_QUERY_RATE = float(os.getenv("QUOTA_QUERY_RATE", 2))
+QUOTA_QUERY_BURST = int(os.getenv("QUOTA_QUERY_BURST", 60))
+QUOTA_QUERY_BUCKETS_PER_TOKEN = 2000  # an aggregation costs one more token per this many estimated buckets
+QUOTA_QUERY_CONCURRENCY = int(os.getenv("QUOTA_QUERY_CONCURRENCY", 4))  # database aggregations in flight per user
+QUOTA_SLOT_TTL = TIMESERIES_STATEMENT_TIMEOUT_MS // 1000 * 2  # leases outliving this belong to dead workers
+QUOTA_INGEST_RATE = float(os.getenv("QUOTA_INGEST_RATE", 10))
+QUOTA_INGEST_BURST = int(os.getenv("QUOTA_INGEST_BURST", 100))
+
+# Computed /api/timeseries/ responses are cached by ETag; once an upload's dirty ranges are refreshed, a Celery
+# task (metrics.warmup) recomputes the user's most requested queries, at most once per WARMUP_DEBOUNCE seconds
+TIMESERIES_RESPONSE_CACHE_TTL = timedelta(days=1)
+TIMESERIES_RESPONSE_CACHE_SIZE = 20  # responses kept per user; the least recently used go first
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_DEBOUNCE = 30
+WARMUP_MAX_QUERIES = 5  # query shapes warmed per user
+WARMUP_QUERY_LOG_SIZE = 50  # query shapes counted per user
+WARMUP_QUERY_LOG_TTL = timedelta(days=30)  # users who stop querying are forgotten
+
+# Recent points kept per (user, series) in Redis; windows entirely inside the horizon skip the database
+HOT_TIER_HORIZON = timedelta(hours=2)
+HOT_TIER_MAX_POINTS = 10000
+
+# Chunks older than COLD_STORAGE_AFTER are moved to Parquet under COLD_STORAGE_URL (a local path or s3://bucket/prefix)
+COLD_STORAGE_AFTER = timedelta(days=int(os.getenv("COLD_STORAGE_AFTER_DAYS", 365)))
+COLD_STORAGE_URL = os.getenv("COLD_STORAGE_URL", os.path.join(BASE_DIR, "cold_storage"))
+COLD_STORAGE_S3_OPTIONS = {
+    "s3_endpoint": os.getenv("COLD_STORAGE_S3_ENDPOINT"),
+    "s3_region": os.getenv("COLD_STORAGE_S3_REGION"),
+    "s3_access_key_id": os.getenv("COLD_STORAGE_S3_ACCESS_KEY_ID"),
+    "s3_secret_access_key": os.getenv("COLD_STORAGE_S3_SECRET_ACCESS_KEY"),
+}
+
 # Rest Framework
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
@@ -110,6 +181,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 100,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_CLASSES": ["metrics.throttling.QueryQuotaThrottle"],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -184,9 +256,32 @@ TEST_DISCOVER_PATTERNS = ["test_*.py", "*_test.py", "tests/*.py"]
 
 from datetime import timedelta
 
-# CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    "refresh-dirty-ranges": {
+        "task": "metrics.tasks.refresh_dirty_ranges",
+        "schedule": timedelta(minutes=1),
+    },
+    "archive-cold-chunks": {
+        "task": "metrics.tasks.archive_cold_chunks",
+        "schedule": timedelta(days=1),
+    },
+}
+
+# Request profiling (metrics.profiling): requests with a signed X-Profile-Token header from
+# `manage.py profile_token`, plus a sampled share of requests under PROFILING_PATHS
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0))
+PROFILING_PATHS = ["/api/timeseries/"]
+PROFILING_INTERVAL = 0.001  # seconds between profiler samples
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+PROFILING_TTL = timedelta(days=1)
+PROFILING_MAX_STORED = 200
+PROFILING_TOP_QUERIES = 20
+PROFILING_TOP_ALLOCATIONS = 20
+
+# Dirty ranges of the same (user, series) closer than this are refreshed together
+DIRTY_RANGE_COALESCE_GAP = timedelta(hours=1)
 
-if DEBUG == "True":
+if DEBUG:
     INSTALLED_APPS += ("debug_toolbar",)
     DEBUG_TOOLBAR_CONFIG = {"SHOW_TOOLBAR_CALLBACK": lambda request: True}
     MIDDLEWARE = [
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta, timezone
+from django.test import SimpleTestCase, override_settings
+from types import SimpleNamespace
+
+from metrics import slices
+from metrics.intervals import Interval
+from metrics.models import MetricType
+from metrics.views import TimeSeriesDataViewSet
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+RGB = MetricType(
+    series="urine_color",
+    schema={"type": "object", "properties": {channel: {"type": "number"} for channel in ("r", "g", "b")}},
+)
+NUMERIC = MetricType(series="heart_rate", schema={"type": "object", "properties": {"value": {"type": "number"}}})
+# Numeric side fields the single statement doesn't aggregate
+SCORED = MetricType(
+    series="blood_oxygen",
+    schema={"type": "object", "properties": {"value": {"type": "number"}, "confidence": {"type": "number"}}},
+)
+# Aggregated as text by the single statement, so never sliced
+STEPS = MetricType(series="steps", schema={"type": "object", "properties": {"value": {"type": "integer"}}})
+MOOD = MetricType(
+    series="mood",
+    schema={"type": "object", "properties": {"value": {"type": "string"}, "score": {"type": "number"}}},
+)
+
+# A slice that saw the bucket but no value for the field
+EMPTY_BUCKET = [
+    {"bucket": START, "series": "heart_rate", "value_count": 0, "value_sum": None, "value_min": None, "value_max": None}
+]
+
+
+def series_fields(metric_type):
+    """The fields the API aggregates for a series, sliced or not"""
+    return TimeSeriesDataViewSet()._get_series_fields(metric_type, "avg")[0]
+
+
+def bucket_parts(points, metric_type, interval):
+    """What a slice query returns: per-bucket count, sum, min and max of each field of (time, value) points"""
+    buckets = {}
+    for time, value in points:
+        buckets.setdefault(interval.floor(time), []).append(value)
+    rows = []
+    for bucket, values in buckets.items():
+        row = {"bucket": bucket, "series": metric_type.series}
+        for field in series_fields(metric_type):
+            numbers = [value[field] for value in values]
+            row.update(
+                {
+                    f"{field}_count": len(numbers),
+                    f"{field}_sum": sum(numbers),
+                    f"{field}_min": min(numbers),
+                    f"{field}_max": max(numbers),
+                }
+            )
+        rows.append(row)
+    return rows
+
+
+def single_statement(points, metric_type, interval, agg_func_name):
+    """What the unsliced query returns for the same points"""
+    buckets = {}
+    for time, value in points:
+        buckets.setdefault(interval.floor(time), []).append(value)
+    aggregate = {"avg": lambda n: sum(n) / len(n), "min": min, "max": max, "count": len}[agg_func_name]
+    return [
+        {
+            "bucket": bucket,
+            "series": metric_type.series,
+            **{field: aggregate([value[field] for value in buckets[bucket]]) for field in series_fields(metric_type)},
+        }
+        for bucket in sorted(buckets, reverse=True)
+    ]
+
+
+def sliced(points, metric_type, interval, agg_func_name, boundaries):
+    edges = [None, *boundaries, None]
+    slice_rows = [
+        bucket_parts(
+            [(t, v) for t, v in points if (lower is None or t >= lower) and (upper is None or t < upper)],
+            metric_type,
+            interval,
+        )
+        for lower, upper in zip(edges[:-1], edges[1:])
+    ]
+    return slices.merge(slice_rows, metric_type, series_fields(metric_type), agg_func_name)
+
+
+class SliceBoundaryTests(SimpleTestCase):
+    chunk_starts = [START + timedelta(weeks=i) for i in range(8)]
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=4, TIMESERIES_PARALLEL_MIN_CHUNKS=8)
+    def test_splits_chunks_evenly_on_chunk_starts(self):
+        self.assertEqual(
+            slices.slice_boundaries(self.chunk_starts),
+            [self.chunk_starts[2], self.chunk_starts[4], self.chunk_starts[6]],
+        )
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=4, TIMESERIES_PARALLEL_MIN_CHUNKS=8)
+    def test_short_windows_are_not_split(self):
+        self.assertEqual(slices.slice_boundaries(self.chunk_starts[:7]), [])
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=4, TIMESERIES_PARALLEL_MIN_CHUNKS=2)
+    def test_chunks_before_after_are_not_counted(self):
+        # Three chunks are left to read, so each gets its own slice
+        self.assertEqual(slices.slice_boundaries(self.chunk_starts, after=self.chunk_starts[5]), self.chunk_starts[6:])
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=8, TIMESERIES_PARALLEL_MIN_CHUNKS=2)
+    def test_never_more_slices_than_chunks(self):
+        self.assertEqual(slices.slice_boundaries(self.chunk_starts[:3]), self.chunk_starts[1:3])
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=1, TIMESERIES_PARALLEL_MIN_CHUNKS=2)
+    def test_disabled_with_one_slice(self):
+        self.assertEqual(slices.slice_boundaries(self.chunk_starts), [])
+
+
+class SliceMergeTests(SimpleTestCase):
+    interval = Interval.parse("1d")
+    # Slice edges fall mid-bucket, so buckets around them are assembled from two slices
+    boundaries = [START + timedelta(days=1, hours=12), START + timedelta(days=3, hours=6)]
+
+    def numeric_points(self):
+        return [(START + timedelta(hours=5 * i), {"value": float((i * 7) % 11) - 3.5}) for i in range(30)]
+
+    def rgb_points(self):
+        return [(START + timedelta(hours=5 * i), {"r": i * 3 % 256, "g": i * 5 % 256, "b": 255 - i}) for i in range(30)]
+
+    def scored_points(self):
+        return [(time, {**value, "confidence": 0.9}) for time, value in self.numeric_points()]
+
+    def test_matches_single_statement_across_slice_edges(self):
+        for metric_type, points in (
+            (NUMERIC, self.numeric_points()),
+            (RGB, self.rgb_points()),
+            (SCORED, self.scored_points()),
+        ):
+            for agg_func_name in slices.SLICEABLE_AGG_FUNCTIONS:
+                with self.subTest(series=metric_type.series, agg_func=agg_func_name):
+                    expected = single_statement(points, metric_type, self.interval, agg_func_name)
+                    result = sliced(points, metric_type, self.interval, agg_func_name, self.boundaries)
+                    self.assertEqual([row["bucket"] for row in result], [row["bucket"] for row in expected])
+                    for row, expected_row in zip(result, expected):
+                        for field in series_fields(metric_type):
+                            self.assertAlmostEqual(row[field], expected_row[field])
+
+    def test_rgb_min_and_max_stay_integers(self):
+        result = sliced(self.rgb_points(), RGB, self.interval, "max", self.boundaries)
+        self.assertTrue(all(isinstance(row[field], int) for row in result for field in ("r", "g", "b")))
+
+    def test_slices_without_a_field_leave_it_to_the_others(self):
+        rows = bucket_parts([(START, {"value": 2.0})], NUMERIC, self.interval)
+        merged = slices.merge([EMPTY_BUCKET, rows], NUMERIC, ["value"], "avg")
+        self.assertEqual(merged, [{"bucket": START, "series": "heart_rate", "value": 2.0}])
+
+    def test_empty_bucket_counts_zero(self):
+        self.assertEqual(slices.merge([EMPTY_BUCKET], NUMERIC, ["value"], "count")[0]["value"], 0)
+
+    def test_side_fields_are_left_out_as_in_the_single_statement(self):
+        result = sliced(self.scored_points(), SCORED, self.interval, "avg", self.boundaries)
+        expected = single_statement(self.scored_points(), SCORED, self.interval, "avg")
+        self.assertEqual({key for row in result for key in row}, {key for row in expected for key in row})
+        self.assertNotIn("confidence", result[0])
+
+
+class SliceGateTests(SimpleTestCase):
+    chunk_starts = [START + timedelta(weeks=i) for i in range(8)]
+
+    def boundaries(self, metric_type):
+        view = TimeSeriesDataViewSet()
+        view._can_slice = True
+        view.get_plan = lambda: SimpleNamespace(chunk_starts=self.chunk_starts)
+        return view._get_slice_boundaries(metric_type, "avg", None)
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=4, TIMESERIES_PARALLEL_MIN_CHUNKS=2)
+    def test_slices_series_aggregated_as_numbers(self):
+        for metric_type in (NUMERIC, RGB, SCORED):
+            with self.subTest(series=metric_type.series):
+                self.assertEqual(len(self.boundaries(metric_type)), 3)
+
+    @override_settings(TIMESERIES_PARALLEL_SLICES=4, TIMESERIES_PARALLEL_MIN_CHUNKS=2)
+    def test_series_aggregated_as_text_run_one_statement(self):
+        for metric_type in (STEPS, MOOD):
+            with self.subTest(series=metric_type.series):
+                self.assertEqual(self.boundaries(metric_type), [])
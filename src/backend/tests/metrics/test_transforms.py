@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+from django.test import SimpleTestCase
+
+from metrics.intervals import Interval
+from metrics.transforms import Transform
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def rows(values, interval="1h", start=START):
+    """One aggregated row per (bucket offset, value) pair"""
+    step = Interval.parse(interval).duration
+    return [{"bucket": start + offset * step, "series": "heart_rate", "value": value} for offset, value in values]
+
+
+def values(result):
+    return [row["value"] for row in result]
+
+
+class TransformGapTests(SimpleTestCase):
+    def test_delta_is_null_after_a_missing_bucket(self):
+        result = Transform.parse("delta").apply(rows([(0, 1.0), (1, 3.0), (3, 10.0), (4, 11.0)]), Interval.parse("1h"))
+        self.assertEqual(values(result), [None, 2.0, None, 1.0])
+
+    def test_rate_is_per_second_of_one_bucket(self):
+        result = Transform.parse("rate").apply(rows([(0, 0.0), (1, 36.0), (5, 0.0)]), Interval.parse("1h"))
+        self.assertEqual(values(result), [None, 0.01, None])
+
+    def test_moving_avg_spans_buckets_not_rows(self):
+        result = Transform.parse("moving_avg:2").apply(
+            rows([(0, 2.0), (1, 4.0), (3, 10.0), (4, 20.0)]), Interval.parse("1h")
+        )
+        # The bucket at 3 only has itself in its window, since the bucket at 2 is empty
+        self.assertEqual(values(result), [None, 3.0, 10.0, 15.0])
+
+    def test_cumsum_is_unchanged_by_gaps(self):
+        result = Transform.parse("cumsum").apply(rows([(0, 1.0), (2, 2.0), (7, 3.0)]), Interval.parse("1h"))
+        self.assertEqual(values(result), [1.0, 3.0, 6.0])
+
+    def test_null_buckets_stay_null(self):
+        result = Transform.parse("delta").apply(rows([(0, 1.0), (1, None), (2, 4.0)]), Interval.parse("1h"))
+        self.assertEqual(values(result), [None, None, None])
+
+    def test_calendar_buckets_are_reindexed_by_month(self):
+        buckets = [datetime(2024, month, 1, tzinfo=timezone.utc) for month in (1, 2, 4)]
+        data = [{"bucket": bucket, "series": "weight", "value": value} for bucket, value in zip(buckets, (1, 2, 5))]
+        result = Transform.parse("delta").apply(data, Interval.parse("1mo"))
+        self.assertEqual(values(result), [None, 1.0, None])
+
+    def test_series_are_reindexed_separately(self):
+        data = rows([(0, 1.0), (1, 2.0)]) + [
+            {"bucket": START + timedelta(hours=offset), "series": "steps", "value": value}
+            for offset, value in ((5, 10.0), (6, 15.0))
+        ]
+        result = Transform.parse("delta").apply(data, Interval.parse("1h"))
+        self.assertEqual(values(result), [None, 1.0, None, 5.0])
+
+    def test_text_series_are_left_alone(self):
+        data = [{"bucket": START, "series": "mood", "value": "calm"}]
+        self.assertEqual(values(Transform.parse("delta").apply(data, Interval.parse("1h"))), ["calm"])
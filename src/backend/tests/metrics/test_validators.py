@@ -0,0 +1,19 @@
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+from unittest import mock
+
+from metrics.views import TimeSeriesDataViewSet
+
+PARAMS = {"interval": "1h", "agg_func": "avg"}
+
+
+class ValidatorTests(SimpleTestCase):
+    def test_invalid_user_id_is_a_validation_error(self):
+        with mock.patch("metrics.views.generations.get_generation") as get_generation:
+            with self.assertRaises(ValidationError):
+                TimeSeriesDataViewSet()._get_validators({**PARAMS, "user_id": "not-a-uuid"})
+        get_generation.assert_not_called()
+
+    def test_no_user_id_has_no_validators(self):
+        self.assertIsNone(TimeSeriesDataViewSet()._get_validators(PARAMS))
+
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+from django.test import SimpleTestCase
+from types import SimpleNamespace
+from unittest import mock
+import uuid
+
+from metrics import generations, tasks
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PARAMS = {"interval": "1h", "agg_func": "avg"}
+
+
+class FakeRedis:
+    """The hash commands data generations use"""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hmget(self, key, *fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def hsetnx(self, key, field, value):
+        self.hashes.setdefault(key, {}).setdefault(field, str(value).encode())
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value).encode()
+
+    def hincrby(self, key, field, amount):
+        stored = self.hashes.setdefault(key, {})
+        stored[field] = str(int(stored.get(field, 0)) + amount).encode()
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+class WarmupAfterRefreshTests(SimpleTestCase):
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        redis = FakeRedis()
+        end = START + timedelta(hours=1)
+        dirty = [
+            SimpleNamespace(id=i, user_id=self.user_id, series_id=series_id, start=START, end=end)
+            for i, series_id in enumerate((1, 2))
+        ]
+        dirty_ranges = mock.MagicMock()
+        dirty_ranges.objects.order_by.return_value.values_list.return_value.__getitem__.return_value = [
+            (row.user_id, row.series_id) for row in dirty
+        ]
+        dirty_ranges.objects.filter.return_value.order_by.return_value.__getitem__.side_effect = lambda _: [
+            row for row in dirty if row.series_id == dirty_ranges.objects.filter.call_args.kwargs.get("series_id")
+        ]
+        for patcher in (
+            mock.patch("metrics.generations.get_redis_connection", return_value=redis),
+            # The refresh runs outside any transaction, so commit callbacks run at once
+            mock.patch("metrics.generations.transaction.on_commit", side_effect=lambda func, using=None: func()),
+            mock.patch("metrics.tasks.DirtyRange", dirty_ranges),
+            mock.patch("metrics.tasks._try_lock_series", return_value=mock.MagicMock(__enter__=lambda _: True)),
+            # Rollups themselves are not under test
+            mock.patch("metrics.rollups.refresh_rollups"),
+            mock.patch("metrics.rollups.MetricType"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def current_etag(self):
+        generation, _ = generations.get_generation(self.user_id)
+        return generations.etag(self.user_id, generation, PARAMS)
+
+    def test_warmed_entry_survives_the_refresh(self):
+        cached_before = self.current_etag()
+        warmed = []
+        with mock.patch("metrics.tasks.warmup.schedule", side_effect=lambda _: warmed.append(self.current_etag())):
+            self.assertEqual(tasks._refresh_dirty_ranges(limit=100), 2)
+
+        # The refresh moved the generation on, and the user was warmed once, under the new one
+        self.assertNotEqual(self.current_etag(), cached_before)
+        self.assertEqual(warmed, [self.current_etag()])
+
+    def test_failed_refreshes_are_not_warmed(self):
+        with (
+            mock.patch("metrics.tasks._refresh_series_ranges", side_effect=RuntimeError("boom")),
+            mock.patch("metrics.tasks.warmup.schedule") as schedule,
+        ):
+            self.assertEqual(tasks._refresh_dirty_ranges(limit=100), 0)
+        schedule.assert_not_called()
@@ -6,12 +6,20 @@ from django.urls import path
 from rest_framework import routers
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView
 
-from metrics.views import MetricTypeViewSet, SessionViewSet, TimeSeriesDataViewSet
+from metrics.views import (
+    MetricTypeViewSet,
+    ProfileViewSet,
+    SeriesStatsViewSet,
+    SessionViewSet,
+    TimeSeriesDataViewSet,
+)
 
 router = routers.DefaultRouter()
 router.register(r"metrictypes", MetricTypeViewSet, basename="metrictypes")
+router.register(r"series", SeriesStatsViewSet, basename="series")
 router.register(r"timeseries", TimeSeriesDataViewSet, basename="timeseries")
 router.register(r"sessions", SessionViewSet, basename="sessions")
+router.register(r"profiles", ProfileViewSet, basename="profiles")
 
 urlpatterns = [
     path("admin/", admin.site.urls),